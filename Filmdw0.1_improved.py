@@ -1,279 +1,40 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-import threading
-import requests
-import os
 import logging
-import m3u8
-import subprocess
-from urllib.parse import urljoin, urlparse
-import time
-from typing import Optional, Callable
-from dataclasses import dataclass
+import threading
 from pathlib import Path
-import sys
-import queue
-
+from typing import Optional
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO, 
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('video_downloader.log'),
-        logging.StreamHandler()
-    ]
-)
-
-@dataclass
-class DownloadConfig:
-    """Конфигурация для загрузки"""
-    max_retries: int = 5
-    retry_delay: int = 5
-    timeout: int = 30
-    chunk_size: int = 8192
-    segment_timeout: int = 10
-
-class DownloadManager:
-    """Менеджер загрузки с поддержкой паузы и остановки"""
-    
-    def __init__(self, config: DownloadConfig):
-        self.config = config
-        self.is_paused = False
-        self.is_stopped = False
-        self.download_thread: Optional[threading.Thread] = None
-        self.progress_callback: Optional[Callable] = None
-        
-    def pause(self):
-        """Приостановить загрузку"""
-        self.is_paused = True
-        logging.info("Загрузка приостановлена")
-        
-    def resume(self):
-        """Возобновить загрузку"""
-        self.is_paused = False
-        logging.info("Загрузка возобновлена")
-        
-    def stop(self):
-        """Остановить загрузку (без блокировки GUI)"""
-        self.is_stopped = True
-        self.is_paused = False
-        # Не блокируем главный поток ожиданием join; поток отмечаем как фоновой при создании
-        logging.info("Загрузка остановлена")
-        
-    def wait_if_paused(self):
-        """Ожидание при паузе"""
-        while self.is_paused and not self.is_stopped:
-            time.sleep(0.01)  # Уменьшаем время ожидания для лучшей отзывчивости
-            
-    def is_stopped_or_paused(self) -> bool:
-        """Проверка остановки или паузы"""
-        return self.is_stopped or self.is_paused
+from filmdw import DownloadConfig, JobScheduler, JobStore, ProgressTracker
+from filmdw.log import setup_logging
 
-class VideoDownloader:
-    """Класс для загрузки видео"""
-    
-    def __init__(self, config: DownloadConfig):
-        self.config = config
-        self.download_manager = DownloadManager(config)
-        
-    def download_segment(self, segment_url: str, segment_file: Path, 
-                        segment_index: int, total_segments: int) -> bool:
-        """Загрузка одного сегмента с повторными попытками"""
-        
-        for attempt in range(self.config.max_retries):
-            try:
-                self.download_manager.wait_if_paused()
-                
-                if self.download_manager.is_stopped:
-                    return False
-                    
-                if segment_file.exists():
-                    logging.info(f"Сегмент {segment_index + 1}/{total_segments}: уже загружен")
-                    return True
-                
-                logging.info(f"Загружаем сегмент {segment_index + 1}/{total_segments}: {segment_url}")
-                
-                response = requests.get(
-                    segment_url, 
-                    timeout=self.config.segment_timeout,
-                    headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-                )
-                response.raise_for_status()
-                
-                segment_file.write_bytes(response.content)
-                return True
-                
-            except requests.exceptions.RequestException as e:
-                logging.warning(f"Ошибка загрузки сегмента {segment_url}: {e}. "
-                              f"Попытка {attempt + 1}/{self.config.max_retries}")
-                if attempt < self.config.max_retries - 1:
-                    time.sleep(self.config.retry_delay)
-                    
-        logging.error(f"Не удалось загрузить сегмент {segment_url} после {self.config.max_retries} попыток")
-        return False
-    
-    def download_m3u8_video(self, playlist_url: str, output_dir: Path, 
-                           progress_callback: Optional[Callable] = None) -> bool:
-        """Загрузка M3U8 видео"""
-        try:
-            # Получаем ID видео из URL
-            video_id = self._extract_video_id(playlist_url)
-            logging.info(f"ID видео: {video_id}")
-            
-            # Создаем структуру папок
-            video_dir = output_dir / video_id
-            segments_dir = video_dir / 'segments'
-            video_dir.mkdir(parents=True, exist_ok=True)
-            segments_dir.mkdir(exist_ok=True)
-            
-            # Загружаем плейлист
-            response = requests.get(playlist_url, timeout=self.config.timeout)
-            response.raise_for_status()
-            
-            m3u8_obj = m3u8.loads(response.text)
-            total_segments = len(m3u8_obj.segments)
-            
-            if total_segments == 0:
-                logging.error("Плейлист не содержит сегментов")
-                return False
-            
-            # Загружаем сегменты
-            for i, segment in enumerate(m3u8_obj.segments):
-                if self.download_manager.is_stopped:
-                    return False
-                    
-                segment_url = urljoin(playlist_url, segment.uri)
-                segment_file = segments_dir / f"segment_{i:04d}.ts"
-                
-                success = self.download_segment(segment_url, segment_file, i, total_segments)
-                if not success:
-                    return False
-                
-                # Обновляем прогресс
-                if progress_callback:
-                    progress_callback(i + 1, total_segments)
-            
-            # Объединяем сегменты
-            return self._merge_segments(video_dir, segments_dir, total_segments)
-            
-        except Exception as e:
-            logging.error(f"Ошибка при загрузке M3U8 видео: {e}")
-            return False
-    
-    def download_mp4_video(self, video_url: str, output_dir: Path, 
-                          progress_callback: Optional[Callable] = None) -> bool:
-        """Загрузка MP4 видео"""
-        try:
-            video_id = self._extract_video_id(video_url)
-            video_dir = output_dir / video_id
-            video_dir.mkdir(parents=True, exist_ok=True)
-            
-            video_path = video_dir / 'output.mp4'
-            
-            response = requests.get(
-                video_url, 
-                stream=True, 
-                timeout=self.config.timeout,
-                headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            )
-            response.raise_for_status()
-            
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded_size = 0
-            
-            with open(video_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=self.config.chunk_size):
-                    if self.download_manager.is_stopped:
-                        return False
-                        
-                    self.download_manager.wait_if_paused()
-                    
-                    if chunk:
-                        f.write(chunk)
-                        downloaded_size += len(chunk)
-                        
-                        if progress_callback and total_size > 0:
-                            progress_callback(downloaded_size, total_size)
-            
-            logging.info(f"MP4 видео успешно загружено: {video_path}")
-            return True
-            
-        except Exception as e:
-            logging.error(f"Ошибка при загрузке MP4 видео: {e}")
-            return False
-    
-    def _extract_video_id(self, url: str) -> str:
-        """Извлечение ID видео из URL"""
-        try:
-            parsed = urlparse(url)
-            path_parts = parsed.path.strip('/').split('/')
-            if len(path_parts) >= 3:
-                return path_parts[-3]
-            elif len(path_parts) >= 1:
-                return path_parts[-1].split('.')[0]
-            else:
-                return f"video_{int(time.time())}"
-        except Exception:
-            return f"video_{int(time.time())}"
-    
-    def _merge_segments(self, video_dir: Path, segments_dir: Path, 
-                       total_segments: int) -> bool:
-        """Объединение сегментов в единый файл"""
-        try:
-            output_path = video_dir / 'output.mp4'
-            
-            if output_path.exists():
-                logging.info(f"Выходной файл уже существует: {output_path}")
-                return True
-            
-            # Создаем список файлов для FFmpeg
-            filelist_path = video_dir / 'filelist.txt'
-            with open(filelist_path, 'w', encoding='utf-8') as f:
-                for i in range(total_segments):
-                    segment_path = segments_dir / f'segment_{i:04d}.ts'
-                    if segment_path.exists():
-                        f.write(f"file '{segment_path.absolute()}'\n")
-                    else:
-                        logging.warning(f"Сегмент отсутствует: {segment_path}")
-            
-            # Запускаем FFmpeg
-            ffmpeg_cmd = [
-                'ffmpeg', '-f', 'concat', '-safe', '0', 
-                '-i', str(filelist_path), '-c', 'copy', str(output_path),
-                '-y'  # Перезаписывать существующий файл
-            ]
-            
-            result = subprocess.run(
-                ffmpeg_cmd, 
-                capture_output=True, 
-                text=True, 
-                timeout=300  # 5 минут таймаут
-            )
-            
-            if result.returncode == 0:
-                logging.info(f"Видео успешно объединено: {output_path}")
-                # Удаляем временные файлы
-                filelist_path.unlink(missing_ok=True)
-                return True
-            else:
-                logging.error(f"Ошибка FFmpeg: {result.stderr}")
-                return False
-                
-        except subprocess.TimeoutExpired:
-            logging.error("Таймаут при объединении сегментов")
-            return False
-        except Exception as e:
-            logging.error(f"Ошибка при объединении сегментов: {e}")
-            return False
 
 class VideoDownloaderGUI:
     """Графический интерфейс для загрузчика видео"""
     
+    # Колонки таблицы заданий: заголовок и ширина
+    COLUMNS = {
+        'url': ("URL", 260),
+        'status': ("Статус", 90),
+        'progress': ("Прогресс", 70),
+        'segments': ("Сегменты", 80),
+        'speed': ("Скорость", 80),
+        'eta': ("Осталось", 70),
+        'retries': ("Повторы", 60),
+    }
+    STATUS_TITLES = {
+        'queued': "в очереди",
+        'running': "загрузка",
+        'paused': "пауза",
+        'done': "готово",
+        'failed': "ошибка",
+        'stopped': "остановлено",
+    }
+    
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("Видео Загрузчик v2.0")
-        self.root.geometry("600x400")
+        self.root.geometry("900x520")
         self.root.resizable(True, True)
         
         # Настройка приоритета обработки событий
@@ -281,18 +42,28 @@ class VideoDownloaderGUI:
         
         # Конфигурация
         self.config = DownloadConfig()
-        self.downloader = VideoDownloader(self.config)
+        # Все задания выполняет один планировщик: общие соединения, кэш и лимиты.
+        # Потоки загрузки только обновляют трекеры, окно опрашивает их по таймеру
+        self.scheduler = JobScheduler(self.config, JobStore(Path(':memory:')),
+                                      progress_callback=self._on_job_progress,
+                                      finished_callback=self._on_job_finished)
+        self.jobs = {}  # id задания -> DownloadJob
+        self.trackers = {}  # id задания -> ProgressTracker
+        self._snapshots = {}  # id задания -> последний ProgressSnapshot
+        self._retries = {}  # id задания -> число повторов
+        self._finished = {}  # id задания -> завершенное задание (из потока планировщика)
+        self._shown = {}  # id строки -> значения, которые сейчас в таблице
+        self._poll_job = None
         
         # Переменные
         self.url_var = tk.StringVar()
         self.dir_var = tk.StringVar()
         self.progress_var = tk.StringVar(value="Готов к загрузке")
         
-        # Флаг для предотвращения множественных загрузок
-        self.is_downloading = False
-        
         self._setup_ui()
         self._center_window()
+        self.scheduler.start()
+        self._poll_progress()
         
         # Обработчик закрытия окна
         self.root.protocol("WM_DELETE_WINDOW", self._on_closing)
@@ -335,29 +106,44 @@ class VideoDownloaderGUI:
         
         ttk.Button(dir_frame, text="Выбрать", command=self._select_directory).grid(row=0, column=1, padx=(5, 0))
         
-        # Прогресс
-        ttk.Label(main_frame, text="Прогресс:").grid(row=2, column=0, sticky=tk.W, pady=(20, 5))
-        
+        # Таблица заданий
+        jobs_frame = ttk.Frame(main_frame)
+        jobs_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(15, 5))
+        jobs_frame.columnconfigure(0, weight=1)
+        jobs_frame.rowconfigure(0, weight=1)
+        main_frame.rowconfigure(2, weight=1)
+        
+        self.jobs_tree = ttk.Treeview(jobs_frame, columns=tuple(self.COLUMNS), show='headings',
+                                      selectmode='extended', height=10)
+        for column, (title, width) in self.COLUMNS.items():
+            self.jobs_tree.heading(column, text=title)
+            self.jobs_tree.column(column, width=width, stretch=(column == 'url'))
+        self.jobs_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar = ttk.Scrollbar(jobs_frame, orient=tk.VERTICAL, command=self.jobs_tree.yview)
+        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.jobs_tree.configure(yscrollcommand=scrollbar.set)
+        
+        # Общий прогресс
         self.progress_label = ttk.Label(main_frame, textvariable=self.progress_var)
-        self.progress_label.grid(row=2, column=1, sticky=(tk.W, tk.E), padx=(5, 0), pady=(20, 5))
+        self.progress_label.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
         
         self.progress_bar = ttk.Progressbar(main_frame, mode='determinate', length=400)
-        self.progress_bar.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=5)
+        self.progress_bar.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=5)
         
-        # Кнопки управления
+        # Кнопки управления (пауза и остановка действуют на выбранные задания)
         button_frame = ttk.Frame(main_frame)
-        button_frame.grid(row=4, column=0, columnspan=2, pady=20)
+        button_frame.grid(row=5, column=0, columnspan=2, pady=10)
         
-        self.start_btn = ttk.Button(button_frame, text="Начать загрузку", command=self._start_download)
+        self.start_btn = ttk.Button(button_frame, text="Добавить загрузку", command=self._start_download)
         self.start_btn.pack(side=tk.LEFT, padx=5)
         
-        self.pause_btn = ttk.Button(button_frame, text="Пауза", command=self._pause_download, state=tk.DISABLED)
+        self.pause_btn = ttk.Button(button_frame, text="Пауза", command=self._pause_download)
         self.pause_btn.pack(side=tk.LEFT, padx=5)
         
-        self.resume_btn = ttk.Button(button_frame, text="Продолжить", command=self._resume_download, state=tk.DISABLED)
+        self.resume_btn = ttk.Button(button_frame, text="Продолжить", command=self._resume_download)
         self.resume_btn.pack(side=tk.LEFT, padx=5)
         
-        self.stop_btn = ttk.Button(button_frame, text="Остановить", command=self._stop_download, state=tk.DISABLED)
+        self.stop_btn = ttk.Button(button_frame, text="Остановить", command=self._stop_download)
         self.stop_btn.pack(side=tk.LEFT, padx=5)
         
         # Кнопка очистки полей
@@ -366,11 +152,11 @@ class VideoDownloaderGUI:
         
         # Статус
         self.status_label = ttk.Label(main_frame, text="Готов к работе", foreground="green")
-        self.status_label.grid(row=5, column=0, columnspan=2, pady=10)
+        self.status_label.grid(row=6, column=0, columnspan=2, pady=5)
         
         # Подсказки
         hints_frame = ttk.Frame(main_frame)
-        hints_frame.grid(row=6, column=0, columnspan=2, pady=5)
+        hints_frame.grid(row=7, column=0, columnspan=2, pady=5)
         
         hints_text = "Горячие клавиши: Ctrl+L (URL), Ctrl+D (папка), Ctrl+R (очистить), Enter (следующее поле)"
         hints_label = ttk.Label(hints_frame, text=hints_text, font=("TkDefaultFont", 8), foreground="gray")
@@ -405,32 +191,111 @@ class VideoDownloaderGUI:
             # Игнорируем ошибки при закрытии диалога
             pass
     
-    def _post_progress(self, current: int, total: int):
-        """Получено из фонового потока: делегируем обновление в главный поток"""
-        # Используем более эффективный способ обновления UI
-        try:
-            self.root.after_idle(lambda: self._update_progress_ui(current, total))
-        except tk.TclError:
-            # Окно закрыто, игнорируем обновление
-            pass
-
-    def _update_progress_ui(self, current: int, total: int):
-        """Обновление прогресса (главный поток Tk)"""
+    @property
+    def is_downloading(self) -> bool:
+        return bool(self.scheduler.running)
+    
+    def _on_job_progress(self, job, current: int, total: int, stats: Optional[dict] = None):
+        """Событие прогресса из потока задания: только запись в трекер"""
+        tracker = self.trackers.get(job.id)
+        if tracker is None:
+            tracker = self.trackers.setdefault(job.id, ProgressTracker())
+        tracker.update(current, total, stats)
+    
+    def _on_job_finished(self, job):
+        """Задание завершено (поток планировщика): результат заберет кадр опроса"""
+        self._finished[job.id] = job
+    
+    def _poll_progress(self):
+        """Кадр обновления таблицы заданий (главный поток Tk) с частотой config.progress_fps"""
         try:
-            percentage = (current / total) * 100 if total else 0
-            self.progress_bar['value'] = percentage
-            self.progress_var.set(f"Загружено: {current}/{total} ({percentage:.1f}%)")
+            self._collect_finished()
+            self._refresh_jobs()
+            interval = int(1000 / max(1, self.config.progress_fps))
+            self._poll_job = self.root.after(interval, self._poll_progress)
         except tk.TclError:
-            # Окно закрыто, игнорируем обновление
-            pass
+            # Окно закрыто
+            self._poll_job = None
+    
+    def _collect_finished(self):
+        for job_id in list(self._finished):
+            job = self._finished.pop(job_id)
+            self.jobs[job_id] = job
+            title = self.STATUS_TITLES.get(job.status, job.status)
+            if job.status == 'done':
+                self.status_label.config(text=f"Задание {job_id} загружено", foreground="green")
+            elif job.status == 'failed':
+                self.status_label.config(text=f"Задание {job_id}: {title} ({job.error})", foreground="red")
+    
+    def _job_status(self, job_id: int) -> str:
+        downloader = self.scheduler.running.get(job_id)
+        if downloader is None:
+            return self.jobs[job_id].status
+        self._retries[job_id] = downloader.retries
+        return 'paused' if downloader.download_manager.is_paused else 'running'
+    
+    def _refresh_jobs(self):
+        """Пересчет состояния всех заданий и перерисовка видимых изменившихся строк
+        
+        Трекеры опрашиваются для всех заданий, чтобы не сбивать сглаживание
+        скорости, но Treeview обновляется только для строк в видимой области
+        таблицы и только если текст в них изменился. Строки вне экрана
+        догоняют в первом кадре после прокрутки.
+        """
+        active = queued = 0
+        percentage_sum = 0.0
+        speed_sum = 0.0
+        for job_id, job in self.jobs.items():
+            tracker = self.trackers.get(job_id)
+            snapshot = tracker.poll() if tracker is not None else None
+            if snapshot is not None:
+                self._snapshots[job_id] = snapshot
+            snapshot = self._snapshots.get(job_id)
+            status = self._job_status(job_id)
+            
+            if status == 'queued':
+                queued += 1
+            elif status in ('running', 'paused'):
+                active += 1
+                if snapshot is not None:
+                    percentage_sum += snapshot.percentage
+                    if status == 'running':
+                        speed_sum += snapshot.speed
+            
+            iid = str(job_id)
+            if not self.jobs_tree.bbox(iid):
+                continue
+            values = self._row_values(job, status, snapshot)
+            if self._shown.get(iid) != values:
+                self.jobs_tree.item(iid, values=values)
+                self._shown[iid] = values
+        
+        self.progress_bar['value'] = percentage_sum / active if active else 0
+        if active or queued:
+            self.progress_var.set(f"Активно: {active}, в очереди: {queued}, "
+                                  f"{speed_sum / 1048576:.1f} МБ/с")
+        else:
+            self.progress_var.set("Готов к загрузке")
+    
+    def _row_values(self, job, status: str, snapshot) -> tuple:
+        progress = segments = speed = eta = ''
+        if snapshot is not None:
+            progress = f"{snapshot.percentage:.1f}%"
+            if snapshot.concurrency:
+                segments = f"{snapshot.current}/{snapshot.total}"
+            if status == 'running':
+                speed = f"{snapshot.speed / 1048576:.1f} МБ/с"
+                if snapshot.eta is not None:
+                    minutes, seconds = divmod(int(snapshot.eta), 60)
+                    eta = f"{minutes}:{seconds:02d}"
+        if status == 'done':
+            progress = "100%"
+        return (job.url, self.STATUS_TITLES.get(status, status), progress, segments,
+                speed, eta, self._retries.get(job.id, 0))
     
     def _start_download(self):
-        """Начать загрузку"""
+        """Добавить загрузку в очередь"""
         try:
-            # Предотвращаем множественные загрузки
-            if self.is_downloading:
-                return
-                
             url = self.url_var.get().strip()
             directory = self.dir_var.get().strip()
             
@@ -457,116 +322,43 @@ class VideoDownloaderGUI:
                 self.url_entry.focus_set()
                 return
             
-            # Обновляем UI
-            self.is_downloading = True
-            self._set_download_mode(True)
-            self.status_label.config(text="Загрузка...", foreground="blue")
-            
-            # Запускаем загрузку в отдельном потоке
-            self.downloader.download_manager.progress_callback = self._post_progress
-
-            if file_extension == '.m3u8':
-                self.downloader.download_manager.download_thread = threading.Thread(
-                    target=self._download_m3u8_wrapper, args=(url, directory), daemon=True
-                )
-            else:
-                self.downloader.download_manager.download_thread = threading.Thread(
-                    target=self._download_mp4_wrapper, args=(url, directory), daemon=True
-                )
-
-            self.downloader.download_manager.download_thread.start()
+            job = self.scheduler.add(url, Path(directory))
+            self.jobs[job.id] = job
+            self.trackers.setdefault(job.id, ProgressTracker())
+            self.jobs_tree.insert('', tk.END, iid=str(job.id),
+                                  values=self._row_values(job, job.status, None))
+            self.status_label.config(text=f"Задание {job.id} добавлено", foreground="blue")
+            # Поле URL освобождается для следующей загрузки
+            self.url_var.set("")
+            self.url_entry.focus_set()
         except Exception as e:
             logging.error(f"Ошибка при запуске загрузки: {e}")
             messagebox.showerror("Ошибка", f"Не удалось запустить загрузку: {e}")
-            self.is_downloading = False
-            self._set_download_mode(False)
-    
-    def _download_m3u8_wrapper(self, url: str, directory: str):
-        """Обертка для загрузки M3U8"""
-        try:
-            success = self.downloader.download_m3u8_video(url, Path(directory), self._post_progress)
-            self._download_finished(success, "M3U8 видео")
-        except Exception as e:
-            logging.error(f"Ошибка в потоке загрузки M3U8: {e}")
-            self._download_finished(False, "M3U8 видео")
     
-    def _download_mp4_wrapper(self, url: str, directory: str):
-        """Обертка для загрузки MP4"""
-        try:
-            success = self.downloader.download_mp4_video(url, Path(directory), self._post_progress)
-            self._download_finished(success, "MP4 видео")
-        except Exception as e:
-            logging.error(f"Ошибка в потоке загрузки MP4: {e}")
-            self._download_finished(False, "MP4 видео")
-    
-    def _download_finished(self, success: bool, video_type: str):
-        """Обработка завершения загрузки"""
-        try:
-            self.is_downloading = False
-            self.root.after_idle(lambda: self._set_download_mode(False))
-            
-            if success:
-                self.root.after_idle(lambda: self.status_label.config(text="Загрузка завершена успешно!", foreground="green"))
-                self.root.after_idle(lambda: messagebox.showinfo("Успех", f"{video_type} успешно загружено!"))
-            else:
-                self.root.after_idle(lambda: self.status_label.config(text="Ошибка загрузки", foreground="red"))
-                self.root.after_idle(lambda: messagebox.showerror("Ошибка", f"Не удалось загрузить {video_type}"))
-        except tk.TclError:
-            # Окно закрыто, игнорируем обновление
-            pass
-    
-    def _set_download_mode(self, downloading: bool):
-        """Установка режима загрузки"""
-        try:
-            if downloading:
-                self.start_btn.config(state=tk.DISABLED)
-                self.pause_btn.config(state=tk.NORMAL)
-                self.stop_btn.config(state=tk.NORMAL)
-                # Блокируем поля ввода во время загрузки
-                self.url_entry.config(state=tk.DISABLED)
-                self.dir_entry.config(state=tk.DISABLED)
-            else:
-                self.start_btn.config(state=tk.NORMAL)
-                self.pause_btn.config(state=tk.DISABLED)
-                self.resume_btn.config(state=tk.DISABLED)
-                self.stop_btn.config(state=tk.DISABLED)
-                self.progress_bar['value'] = 0
-                self.progress_var.set("Готов к загрузке")
-                # Разблокируем поля ввода после загрузки
-                self.url_entry.config(state=tk.NORMAL)
-                self.dir_entry.config(state=tk.NORMAL)
-                # Возвращаем фокус на поле URL
-                self.url_entry.focus_set()
-        except tk.TclError:
-            # Окно закрыто, игнорируем обновление
-            pass
+    def _selected_jobs(self) -> list:
+        return [int(iid) for iid in self.jobs_tree.selection()]
     
     def _pause_download(self):
-        """Приостановить загрузку"""
+        """Приостановить выбранные загрузки"""
         try:
-            self.downloader.download_manager.pause()
-            self.pause_btn.config(state=tk.DISABLED)
-            self.resume_btn.config(state=tk.NORMAL)
-            self.status_label.config(text="Загрузка приостановлена", foreground="orange")
+            for job_id in self._selected_jobs():
+                self.scheduler.pause(job_id)
         except Exception as e:
             logging.error(f"Ошибка при паузе: {e}")
     
     def _resume_download(self):
-        """Возобновить загрузку"""
+        """Возобновить выбранные загрузки"""
         try:
-            self.downloader.download_manager.resume()
-            self.pause_btn.config(state=tk.NORMAL)
-            self.resume_btn.config(state=tk.DISABLED)
-            self.status_label.config(text="Загрузка...", foreground="blue")
+            for job_id in self._selected_jobs():
+                self.scheduler.resume(job_id)
         except Exception as e:
             logging.error(f"Ошибка при возобновлении: {e}")
     
     def _stop_download(self):
-        """Остановить загрузку"""
+        """Остановить выбранные загрузки"""
         try:
-            self.downloader.download_manager.stop()
-            self._set_download_mode(False)
-            self.status_label.config(text="Загрузка остановлена", foreground="red")
+            for job_id in self._selected_jobs():
+                self.scheduler.cancel(job_id)
         except Exception as e:
             logging.error(f"Ошибка при остановке: {e}")
     
@@ -598,21 +390,39 @@ class VideoDownloaderGUI:
             logging.error(f"Ошибка при очистке полей: {e}")
     
     def _on_closing(self):
-        """Обработчик закрытия окна"""
+        """Обработчик закрытия окна
+        
+        Завершения заданий ждет отдельный поток, чтобы не блокировать
+        главный поток Tk: окно сразу скрывается и уничтожается, когда
+        планировщик закрыт.
+        """
         try:
-            if self.is_downloading:
-                self.downloader.download_manager.stop()
-            self.root.destroy()
+            if self._poll_job is not None:
+                self.root.after_cancel(self._poll_job)
+                self._poll_job = None
+            self.root.withdraw()
+            closer = threading.Thread(target=self.scheduler.close, name='scheduler-close', daemon=True)
+            closer.start()
+            self._destroy_when_closed(closer)
         except Exception as e:
             logging.error(f"Ошибка при закрытии окна: {e}")
             self.root.destroy()
     
+    def _destroy_when_closed(self, closer: threading.Thread):
+        """Уничтожить окно, когда поток закрытия планировщика завершится"""
+        if closer.is_alive():
+            self.root.after(50, self._destroy_when_closed, closer)
+        else:
+            self.root.destroy()
+    
     def run(self):
         """Запуск приложения"""
         self.root.mainloop()
 
 def main():
     """Главная функция"""
+    # Настройка логирования (не при импорте модуля, а при запуске приложения)
+    setup_logging(logging.INFO, log_file='video_downloader.log')
     try:
         app = VideoDownloaderGUI()
         app.run()
@@ -0,0 +1,184 @@
+"""Бенчмарк загрузки: VideoDownloader против локального имитатора источника
+
+Источник (origin.py) работает в отдельном процессе, каждый прогон
+сценария - в новом интерпретаторе, поэтому пиковая память и процессорное
+время относятся только к загрузчику. Для каждого сценария выводится
+медиана по повторам: время, сегменты/с, МБ/с, пиковый RSS и CPU.
+Ошибки источника детерминированы номером повтора, так что прогоны
+воспроизводимы и их можно сравнивать между версиями и движками.
+
+Запуск из корня репозитория:
+    python benchmarks/download_bench.py [-n 3] [-k hls] [--transport async] [--json]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from origin import Profile
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Имя, ресурс, параметры профиля источника, поля DownloadConfig
+SCENARIOS = [
+    ('hls-local', 'hls', {'segments': 200}, {}),
+    ('hls-latency-50ms', 'hls', {'segments': 200, 'lat': 50}, {}),
+    ('hls-bandwidth-2M', 'hls', {'segments': 60, 'bw': 2 * 1024 ** 2}, {}),
+    ('hls-errors-5%', 'hls', {'segments': 200, 'lat': 10, 'err': 0.05}, {'retry_delay': 0.1}),
+    ('hls-memory-pipeline', 'hls', {'segments': 200, 'lat': 20}, {'memory_pipeline': True}),
+    ('mp4-ranges', 'mp4', {'mp4': 64 * 1024 ** 2, 'bw': 8 * 1024 ** 2}, {}),
+    ('mp4-single-stream', 'mp4', {'mp4': 64 * 1024 ** 2, 'bw': 8 * 1024 ** 2, 'ranges': False}, {}),
+    ('mp4-errors-5%', 'mp4', {'mp4': 32 * 1024 ** 2, 'err': 0.05}, {'retry_delay': 0.1}),
+]
+
+
+def start_origin() -> tuple:
+    """Запуск имитатора источника; возвращает процесс и базовый URL"""
+    process = subprocess.Popen([sys.executable, str(Path(__file__).with_name('origin.py'))],
+                               stdout=subprocess.PIPE, text=True)
+    base_url = process.stdout.readline().strip()
+    if not base_url:
+        process.kill()
+        raise RuntimeError("Имитатор источника не запустился")
+    return process, base_url
+
+
+def peak_rss_mb() -> float:
+    """Пиковый RSS текущего процесса, МБ (None, если модуля resource нет)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS - байты
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_worker(spec: dict) -> dict:
+    """Один прогон сценария (в отдельном процессе)"""
+    sys.path.insert(0, str(ROOT))
+    import logging
+    logging.basicConfig(level=logging.ERROR)
+    from filmdw import DownloadConfig, VideoDownloader
+    
+    config = DownloadConfig(**spec['config'])
+    output_dir = Path(tempfile.mkdtemp(prefix='filmdw-bench-'))
+    downloader = VideoDownloader(config)
+    try:
+        cpu_started = sum(os.times()[:2])
+        started = time.perf_counter()
+        if spec['kind'] == 'hls':
+            success = downloader.download_m3u8_video(spec['url'], output_dir)
+        else:
+            success = downloader.download_mp4_video(spec['url'], output_dir)
+        elapsed = time.perf_counter() - started
+        cpu = sum(os.times()[:2]) - cpu_started
+        size = sum(path.stat().st_size for path in output_dir.rglob('output.*'))
+    finally:
+        downloader.close()
+        shutil.rmtree(output_dir, ignore_errors=True)
+    
+    return {
+        'success': success,
+        'failure': downloader.failure,
+        'elapsed': elapsed,
+        'bytes': size,
+        'cpu': cpu,
+        'rss_mb': peak_rss_mb(),
+        'retries': downloader.retries,
+    }
+
+
+def run_scenario(base_url: str, scenario: tuple, repeat: int, overrides: dict) -> dict:
+    _, kind, origin, config = scenario
+    profile = Profile(**origin, run=repeat)
+    resource = 'hls/index.m3u8' if kind == 'hls' else 'video.mp4'
+    spec = {
+        'kind': kind,
+        'url': f'{base_url}/{profile.format()}/{resource}',
+        # Поток байтов бенчмарка не должен упираться в ffmpeg
+        'config': {'merge_mode': 'ts', **config, **overrides},
+    }
+    result = subprocess.run([sys.executable, __file__, '--worker', json.dumps(spec)],
+                            cwd=ROOT, stdout=subprocess.PIPE, text=True, check=True)
+    run = json.loads(result.stdout.splitlines()[-1])
+    expected = profile.segments * profile.size if kind == 'hls' else profile.mp4
+    run['verified'] = run['success'] and run['bytes'] == expected
+    run['segments'] = profile.segments if kind == 'hls' else 0
+    return run
+
+
+def summarize(name: str, runs: list) -> dict:
+    elapsed = statistics.median(run['elapsed'] for run in runs)
+    size = runs[0]['bytes']
+    rss = [run['rss_mb'] for run in runs if run['rss_mb'] is not None]
+    return {
+        'scenario': name,
+        'ok': all(run['verified'] for run in runs),
+        'elapsed': elapsed,
+        'segments_per_s': runs[0]['segments'] / elapsed if runs[0]['segments'] else None,
+        'mb_per_s': size / 1024 ** 2 / elapsed if elapsed else 0.0,
+        'rss_mb': max(rss) if rss else None,
+        'cpu': statistics.median(run['cpu'] for run in runs),
+        'retries': statistics.median(run['retries'] for run in runs),
+    }
+
+
+def print_table(rows: list):
+    print(f"{'сценарий':22} {'ok':>3} {'время, с':>9} {'сегм/с':>8} {'МБ/с':>8} "
+          f"{'RSS, МБ':>8} {'CPU, с':>7} {'повторы':>8}")
+    for row in rows:
+        segments = f"{row['segments_per_s']:8.1f}" if row['segments_per_s'] else f"{'-':>8}"
+        rss = f"{row['rss_mb']:8.1f}" if row['rss_mb'] is not None else f"{'-':>8}"
+        print(f"{row['scenario']:22} {'да' if row['ok'] else 'нет':>3} {row['elapsed']:9.2f} "
+              f"{segments} {row['mb_per_s']:8.1f} {rss} {row['cpu']:7.2f} {row['retries']:8g}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--repeat', type=int, default=3, help='повторов каждого сценария')
+    parser.add_argument('-k', '--filter', default='', help='только сценарии, содержащие строку')
+    parser.add_argument('--transport', choices=['session', 'async'], help='транспорт загрузчика')
+    parser.add_argument('--workers', type=int, help='max_workers загрузчика')
+    parser.add_argument('--json', action='store_true', help='вывести результаты строками JSON')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        print(json.dumps(run_worker(json.loads(args.worker))))
+        return
+    
+    overrides = {}
+    if args.transport:
+        overrides['transport'] = args.transport
+    if args.workers:
+        overrides['max_workers'] = args.workers
+    
+    scenarios = [scenario for scenario in SCENARIOS if args.filter in scenario[0]]
+    origin, base_url = start_origin()
+    rows = []
+    try:
+        for scenario in scenarios:
+            runs = [run_scenario(base_url, scenario, repeat, overrides) for repeat in range(args.repeat)]
+            row = summarize(scenario[0], runs)
+            rows.append(row)
+            if args.json:
+                print(json.dumps(row, ensure_ascii=False), flush=True)
+    finally:
+        origin.kill()
+        origin.wait()
+    
+    if not args.json:
+        print_table(rows)
+    if not all(row['ok'] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Бенчмарк холодного запуска: время импорта ядра загрузчика
+
+Каждый вариант запускается в новом интерпретаторе несколько раз,
+выводится медиана полного времени процесса и суммарное время импорта
+по данным python -X importtime.
+
+Запуск из корня репозитория: python benchmarks/import_time.py [-n 20]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CASES = [
+    # То, что раньше импортировал монолитный Filmdw0.1_improved.py
+    ('eager (tkinter + requests + m3u8)', 'import tkinter, requests, m3u8, asyncio, sqlite3'),
+    ('import filmdw', 'import filmdw'),
+    ('from filmdw import DownloadConfig', 'from filmdw import DownloadConfig'),
+    ('from filmdw import VideoDownloader', 'from filmdw import VideoDownloader'),
+    ('VideoDownloader + transport', 'from filmdw import DownloadConfig, VideoDownloader; '
+                                    'VideoDownloader(DownloadConfig()).close()'),
+    ('python -m filmdw --help', None),
+]
+
+
+def run_case(statement, runs: int) -> tuple:
+    """Медиана времени процесса (мс) и суммарное время импорта (мс)"""
+    if statement is None:
+        command = [sys.executable, '-m', 'filmdw', '--help']
+    else:
+        command = [sys.executable, '-c', statement]
+    
+    wall = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+        wall.append((time.perf_counter() - started) * 1000)
+    
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + command[1:], cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    imported = 0
+    for line in result.stderr.splitlines():
+        # Строки верхнего уровня: "import time: self | cumulative | name"
+        parts = line.split('|')
+        if line.startswith('import time:') and len(parts) == 3 and not parts[2].startswith('  '):
+            cumulative = parts[1].strip()
+            if cumulative.isdigit():
+                imported += int(cumulative)
+    return statistics.median(wall), imported / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--runs', type=int, default=10, help='число запусков на вариант')
+    args = parser.parse_args()
+    
+    print(f"{'вариант':40} {'процесс, мс':>12} {'импорт, мс':>12}")
+    for name, statement in CASES:
+        wall, imported = run_case(statement, args.runs)
+        print(f"{name:40} {wall:12.1f} {imported:12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""Имитатор источника видео для бенчмарков: синтетические HLS и MP4
+
+Профиль источника задается первым компонентом пути, поэтому один сервер
+обслуживает сценарии с разными задержкой, скоростью и ошибками:
+
+    /lat=50,bw=2M,err=0.02,ranges=1,segments=100,size=256K,mp4=64M,run=0/hls/index.m3u8
+    /<профиль>/hls/seg_00000.ts
+    /<профиль>/video.mp4
+
+lat - задержка перед ответом, мс; bw - скорость одного соединения, байт/с
+(0 - без ограничения); err - доля запросов сегментов и диапазонов MP4,
+на которые отвечается 503; ranges - поддержка Range для MP4.
+Содержимое и ошибки детерминированы: ошибка зависит от профиля (включая
+run), пути и номера обращения к нему, а не от случайного генератора.
+
+Отдельный запуск: python benchmarks/origin.py [--port 8000]
+(первая строка вывода - базовый URL сервера).
+"""
+import argparse
+import hashlib
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PATTERN_SIZE = 64 * 1024
+WRITE_CHUNK = 16 * 1024
+SEGMENT_DURATION = 4
+
+_SIZE_SUFFIXES = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(value: str) -> int:
+    """Число с необязательным суффиксом K/M/G: 256K, 2M, 1.5G"""
+    value = value.strip().upper()
+    multiplier = _SIZE_SUFFIXES.get(value[-1:], 1)
+    if multiplier != 1:
+        value = value[:-1]
+    return int(float(value) * multiplier)
+
+
+@dataclass
+class Profile:
+    """Поведение источника в одном сценарии"""
+    lat: float = 0  # мс
+    bw: int = 0  # байт/с на соединение
+    err: float = 0.0
+    ranges: bool = True
+    segments: int = 100
+    size: int = 256 * 1024
+    mp4: int = 64 * 1024 * 1024
+    run: int = 0
+    
+    @classmethod
+    def parse(cls, text: str) -> 'Profile':
+        profile = cls()
+        for item in filter(None, text.split(',')):
+            name, _, value = item.partition('=')
+            if name == 'lat':
+                profile.lat = float(value)
+            elif name == 'err':
+                profile.err = float(value)
+            elif name == 'ranges':
+                profile.ranges = value not in ('0', 'false', 'no')
+            elif name in ('bw', 'segments', 'size', 'mp4', 'run'):
+                setattr(profile, name, parse_size(value))
+            else:
+                raise ValueError(f"неизвестный параметр профиля: {name}")
+        return profile
+    
+    def format(self) -> str:
+        return (f'lat={self.lat:g},bw={self.bw},err={self.err:g},ranges={int(self.ranges)},'
+                f'segments={self.segments},size={self.size},mp4={self.mp4},run={self.run}')
+
+
+_PATTERN = random.Random(0).randbytes(PATTERN_SIZE)
+
+
+def payload(offset: int, length: int) -> bytes:
+    """Байты [offset, offset + length) бесконечного повторения шаблона"""
+    start = offset % PATTERN_SIZE
+    repeats = (start + length) // PATTERN_SIZE + 1
+    return (_PATTERN * repeats)[start:start + length]
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def do_GET(self):
+        path = self.path.split('?', 1)[0].lstrip('/')
+        profile_text, _, resource = path.partition('/')
+        try:
+            profile = Profile.parse(profile_text)
+        except ValueError:
+            self.send_error(404)
+            return
+        
+        if profile.lat:
+            time.sleep(profile.lat / 1000)
+        
+        if resource == 'hls/index.m3u8':
+            self._send_playlist(profile)
+        elif resource.startswith('hls/seg_') and resource.endswith('.ts'):
+            index = int(resource[len('hls/seg_'):-len('.ts')])
+            if not 0 <= index < profile.segments:
+                self.send_error(404)
+            elif not self._inject_error(profile_text, profile):
+                self._send_body(profile, 200, index * profile.size, profile.size,
+                                {'Content-Type': 'video/mp2t'})
+        elif resource == 'video.mp4':
+            if not self._inject_error(profile_text, profile):
+                self._send_mp4(profile)
+        else:
+            self.send_error(404)
+    
+    def _inject_error(self, profile_text: str, profile: Profile) -> bool:
+        """Ответить 503, если этому обращению выпала ошибка"""
+        if profile.err <= 0:
+            return False
+        key = f'{profile_text}|{self.path}|{self.headers.get("Range", "")}'
+        with self.server.lock:
+            attempt = self.server.attempts.get(key, 0)
+            self.server.attempts[key] = attempt + 1
+        digest = hashlib.blake2b(f'{key}|{attempt}'.encode(), digest_size=8).digest()
+        if int.from_bytes(digest, 'big') / 2 ** 64 >= profile.err:
+            return False
+        self.send_response(503)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        return True
+    
+    def _send_playlist(self, profile: Profile):
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3', f'#EXT-X-TARGETDURATION:{SEGMENT_DURATION}',
+                 '#EXT-X-MEDIA-SEQUENCE:0', '#EXT-X-PLAYLIST-TYPE:VOD']
+        for index in range(profile.segments):
+            lines.append(f'#EXTINF:{SEGMENT_DURATION}.0,')
+            lines.append(f'seg_{index:05d}.ts')
+        lines.append('#EXT-X-ENDLIST')
+        body = ('\n'.join(lines) + '\n').encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/vnd.apple.mpegurl')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_mp4(self, profile: Profile):
+        headers = {'Content-Type': 'video/mp4', 'ETag': f'"mp4-{profile.mp4}"'}
+        byte_range = self.headers.get('Range', '')
+        if not profile.ranges or not byte_range.startswith('bytes='):
+            if profile.ranges:
+                headers['Accept-Ranges'] = 'bytes'
+            self._send_body(profile, 200, 0, profile.mp4, headers)
+            return
+        
+        first, _, last = byte_range[len('bytes='):].partition('-')
+        start = int(first) if first else max(0, profile.mp4 - int(last))
+        end = min(int(last), profile.mp4 - 1) if first and last else profile.mp4 - 1
+        if start > end:
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{profile.mp4}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        headers['Accept-Ranges'] = 'bytes'
+        headers['Content-Range'] = f'bytes {start}-{end}/{profile.mp4}'
+        self._send_body(profile, 206, start, end + 1 - start, headers)
+    
+    def _send_body(self, profile: Profile, status: int, offset: int, length: int, headers: dict):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(length))
+        self.end_headers()
+        
+        started = time.monotonic()
+        sent = 0
+        try:
+            while sent < length:
+                chunk = payload(offset + sent, min(WRITE_CHUNK, length - sent))
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                if profile.bw:
+                    # Равномерная скорость: ждем, пока отправленное не уложится в bw
+                    delay = started + sent / profile.bw - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент прервал загрузку (остановка или отмена диапазона)
+            pass
+
+
+class OriginServer(ThreadingHTTPServer):
+    """Сервер-источник в фоновом потоке; base_url - адрес для профилей"""
+    daemon_threads = True
+    
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), OriginHandler)
+        self.lock = threading.Lock()
+        self.attempts = {}
+        self.base_url = f'http://{host}:{self.server_port}'
+    
+    def start(self) -> 'OriginServer':
+        threading.Thread(target=self.serve_forever, name='origin', daemon=True).start()
+        return self
+    
+    def url(self, profile: Profile, resource: str) -> str:
+        return f'{self.base_url}/{profile.format()}/{resource}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0, help='0 - свободный порт')
+    args = parser.parse_args()
+    
+    server = OriginServer(args.host, args.port)
+    print(server.base_url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
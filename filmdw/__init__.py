@@ -0,0 +1,41 @@
+"""Ядро видеозагрузчика без зависимости от GUI
+
+Классы загружаются из подмодулей при первом обращении (PEP 562),
+поэтому import filmdw не тянет за собой requests, m3u8 и sqlite3.
+"""
+import importlib
+
+_EXPORTS = {
+    'DownloadConfig': 'config',
+    'DownloadManager': 'manager',
+    'VideoDownloader': 'downloader',
+    'DownloadJob': 'jobs',
+    'JobStore': 'jobs',
+    'JobScheduler': 'jobs',
+    'ProgressTracker': 'progress',
+    'DownloadMetrics': 'metrics',
+}
+
+__all__ = [
+    'DownloadConfig',
+    'DownloadManager',
+    'VideoDownloader',
+    'DownloadJob',
+    'JobStore',
+    'JobScheduler',
+    'ProgressTracker',
+    'DownloadMetrics',
+]
+
+
+def __getattr__(name: str):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,260 @@
+"""Локальный кэш сегментов с адресацией по содержимому"""
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Параметры подписанных URL CDN: меняются от запроса к запросу,
+# но не меняют содержимое сегмента
+VOLATILE_PARAMS = {
+    'token', 'expires', 'exp', 'signature', 'sig', 'policy', 'key-pair-id',
+    'hdnts', 'hdntl', 'x-amz-signature', 'x-amz-date', 'x-amz-expires',
+    'x-amz-credential', 'x-amz-security-token', 'x-goog-signature', 'x-goog-date',
+}
+
+FICLONE = 0x40049409  # ioctl клонирования файла (Btrfs, XFS) в Linux
+
+
+def normalize_url(url: str) -> str:
+    """Ключ кэша: URL без фрагмента, порта по умолчанию и параметров подписи"""
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    if parts.port and (parts.scheme, parts.port) not in (('http', 80), ('https', 443)):
+        host = f'{host}:{parts.port}'
+    query = sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if name.lower() not in VOLATILE_PARAMS)
+    return urlunsplit((parts.scheme.lower(), host, parts.path, urlencode(query), ''))
+
+
+def strong_etag(headers) -> Optional[str]:
+    """ETag, по которому можно узнать содержимое под другим URL
+    
+    Годятся только сильные ETag, похожие на хэш содержимого (MD5 у S3
+    и многих CDN). ETag вида "время-размер" (nginx) у разных сегментов
+    одного размера совпадает, поэтому не используется.
+    """
+    etag = headers.get('etag')
+    if not etag or etag.startswith('W/'):
+        return None
+    hex_digits = sum(c in '0123456789abcdefABCDEF' for c in etag)
+    return etag if hex_digits >= 32 else None
+
+
+def new_digest():
+    return hashlib.blake2b(digest_size=20)
+
+
+def link_file(src: Path, dst: Path):
+    """Поместить копию src в dst: жесткая ссылка, клон (reflink) или копирование"""
+    tmp = dst.with_name(f'{dst.name}.{threading.get_ident()}.link')
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        try:
+            import fcntl
+            with open(src, 'rb') as s, open(tmp, 'wb') as d:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except (ImportError, OSError):
+            shutil.copyfile(src, tmp)
+    tmp.replace(dst)
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    """Запись индекса: объект и валидаторы ответа, с которым он был получен"""
+    digest: str
+    path: Path
+    etag: str
+    last_modified: str
+    
+    def conditional_headers(self) -> dict:
+        """Заголовки условного запроса; пустые, если проверить объект нечем"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class SegmentCache:
+    """Кэш сегментов, общий для всех загрузок (и процессов) с одной папкой
+    
+    Содержимое хранится в objects/<blake2b> один раз, сколько бы URL на него
+    ни указывало. Индекс в SQLite связывает нормализованный URL с объектом
+    и валидаторами ответа (ETag, Last-Modified). Сегмент с другим URL,
+    но тем же сильным ETag и размером, тоже берется из кэша - без загрузки
+    тела. Когда объем превышает budget, удаляются давно не использованные
+    объекты (LRU).
+    
+    Запись с валидаторами не отдается по одному URL: загрузчик проверяет ее
+    условным запросом (If-None-Match / If-Modified-Since), и только ответ
+    304 без тела делает ее попаданием (revalidated). Запись без валидаторов
+    проверить нечем, она отдается сразу.
+    """
+    
+    def __init__(self, root: Path, budget: int):
+        import sqlite3
+        self.root = root
+        self.budget = budget
+        self.objects_dir = root / 'objects'
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(root / 'index.sqlite'), check_same_thread=False,
+                                     timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS objects ('
+            ' digest TEXT PRIMARY KEY,'
+            ' size INTEGER NOT NULL,'
+            ' last_used REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' key TEXT PRIMARY KEY,'
+            ' digest TEXT NOT NULL,'
+            " etag TEXT NOT NULL DEFAULT '',"
+            " last_modified TEXT NOT NULL DEFAULT '')"
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_etag ON entries (etag)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS objects_lru ON objects (last_used)')
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+    
+    def _object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+    
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        """Запись для URL или None
+        
+        Попаданием считается только запись без валидаторов; запись
+        с валидаторами становится попаданием после revalidated.
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT digest, etag, last_modified FROM entries WHERE key = ?',
+                                     (normalize_url(url),)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            entry = CacheEntry(row[0], self._object_path(row[0]), row[1], row[2])
+            if not entry.conditional_headers():
+                return entry if self._touch(entry.digest) is not None else None
+            if entry.path.exists():
+                return entry
+            self.misses += 1
+            return None
+    
+    def revalidated(self, entry: CacheEntry) -> Optional[Path]:
+        """Сервер ответил 304 на условный запрос: объект записи или None, если он удален"""
+        with self._lock:
+            return self._touch(entry.digest)
+    
+    def lookup_etag(self, url: str, headers) -> Optional[Path]:
+        """Объект с тем же сильным ETag и размером; URL запоминается за ним"""
+        etag = strong_etag(headers)
+        length = headers.get('content-length')
+        if etag is None or not length or headers.get('content-encoding'):
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT entries.digest FROM entries JOIN objects USING (digest)'
+                ' WHERE entries.etag = ? AND objects.size = ? LIMIT 1',
+                (etag, int(length))
+            ).fetchone()
+            path = self._touch(row[0] if row else None)
+            if path is not None:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO entries (key, digest, etag, last_modified)'
+                    ' VALUES (?, ?, ?, ?)',
+                    (normalize_url(url), row[0], etag, headers.get('last-modified') or '')
+                )
+                self._conn.commit()
+            return path
+    
+    def _touch(self, digest: Optional[str]) -> Optional[Path]:
+        if digest is None:
+            self.misses += 1
+            return None
+        path = self._object_path(digest)
+        if not path.exists():
+            # Объект удален другим процессом или вручную
+            self._conn.execute('DELETE FROM entries WHERE digest = ?', (digest,))
+            self._conn.execute('DELETE FROM objects WHERE digest = ?', (digest,))
+            self._conn.commit()
+            self.misses += 1
+            return None
+        self._conn.execute('UPDATE objects SET last_used = ? WHERE digest = ?', (time.time(), digest))
+        self._conn.commit()
+        self.hits += 1
+        return path
+    
+    def store(self, url: str, path: Path, digest: str, headers):
+        """Положить загруженный файл в кэш (жесткой ссылкой, если возможно)"""
+        object_path = self._object_path(digest)
+        try:
+            if not object_path.exists():
+                object_path.parent.mkdir(exist_ok=True)
+                link_file(path, object_path)
+            size = object_path.stat().st_size
+        except OSError as e:
+            logging.warning(f"Не удалось сохранить сегмент в кэш: {e}")
+            return
+        self._index(url, digest, size, headers)
+    
+    def store_bytes(self, url: str, data: bytes, headers):
+        """Положить в кэш сегмент, загруженный в память"""
+        digest = new_digest()
+        digest.update(data)
+        digest = digest.hexdigest()
+        object_path = self._object_path(digest)
+        try:
+            if not object_path.exists():
+                object_path.parent.mkdir(exist_ok=True)
+                tmp_path = object_path.with_name(f'{digest}.{threading.get_ident()}.tmp')
+                tmp_path.write_bytes(data)
+                tmp_path.replace(object_path)
+        except OSError as e:
+            logging.warning(f"Не удалось сохранить сегмент в кэш: {e}")
+            return
+        self._index(url, digest, len(data), headers)
+    
+    def _index(self, url: str, digest: str, size: int, headers):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO objects (digest, size, last_used) VALUES (?, ?, ?)',
+                (digest, size, time.time())
+            )
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entries (key, digest, etag, last_modified) VALUES (?, ?, ?, ?)',
+                (normalize_url(url), digest, strong_etag(headers) or '',
+                 headers.get('last-modified') or '')
+            )
+            self._conn.commit()
+            self._evict()
+    
+    def _evict(self):
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM objects').fetchone()[0]
+        if total <= self.budget:
+            return
+        # Самые давние объекты удаляем, пока не уложимся в бюджет
+        rows = self._conn.execute('SELECT digest, size FROM objects ORDER BY last_used').fetchall()
+        for digest, size in rows:
+            if total <= self.budget:
+                break
+            self._object_path(digest).unlink(missing_ok=True)
+            self._conn.execute('DELETE FROM entries WHERE digest = ?', (digest,))
+            self._conn.execute('DELETE FROM objects WHERE digest = ?', (digest,))
+            total -= size
+        self._conn.commit()
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
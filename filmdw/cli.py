@@ -0,0 +1,230 @@
+"""Консольный запуск загрузчика без GUI
+
+Пример: python -m filmdw URL... -o DIR -j 16 --json
+Прогресс в режиме --json выводится в stdout строками JSON, журнал - в stderr.
+"""
+import argparse
+import json
+import logging
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from .config import DownloadConfig
+from .log import setup_logging
+
+# Коды завершения по классам ошибок (VideoDownloader.failure)
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+EXIT_NETWORK = 3
+EXIT_MERGE = 4
+EXIT_PLAYLIST = 5
+EXIT_IO = 6
+EXIT_FORMAT = 7
+EXIT_BUSY = 8
+EXIT_INTERRUPTED = 130
+
+FAILURE_EXIT_CODES = {
+    'network': EXIT_NETWORK,
+    'merge': EXIT_MERGE,
+    'playlist': EXIT_PLAYLIST,
+    'io': EXIT_IO,
+    'format': EXIT_FORMAT,
+    'busy': EXIT_BUSY,
+    'stopped': EXIT_INTERRUPTED,
+    'error': EXIT_ERROR,
+}
+
+
+def parse_rate(value: str) -> int:
+    """Скорость в байтах/с: 500000, 512K, 2M, 1.5G"""
+    multipliers = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = value.strip().upper()
+    multiplier = multipliers.get(text[-1:], 1)
+    if multiplier != 1:
+        text = text[:-1]
+    try:
+        rate = float(text) * multiplier
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"неверная скорость: {value}")
+    if rate < 0:
+        raise argparse.ArgumentTypeError(f"неверная скорость: {value}")
+    return int(rate)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    defaults = DownloadConfig()
+    parser = argparse.ArgumentParser(
+        prog='filmdw',
+        description='Загрузка M3U8 и MP4 видео без графического интерфейса',
+    )
+    parser.add_argument('urls', nargs='*', metavar='URL', help='адреса .m3u8 или .mp4')
+    parser.add_argument('-o', '--output', default='.', help='папка сохранения (по умолчанию текущая)')
+    parser.add_argument('-j', '--workers', type=int, default=defaults.max_workers,
+                        help='число параллельно загружаемых сегментов')
+    parser.add_argument('--fixed-workers', action='store_true',
+                        help='не подбирать число запросов, всегда держать --workers')
+    parser.add_argument('-p', '--parallel', type=int, default=defaults.max_jobs,
+                        help='число одновременно загружаемых видео')
+    parser.add_argument('--per-host', type=int, default=defaults.max_jobs_per_host,
+                        help='число одновременных видео с одного хоста')
+    parser.add_argument('--connections', type=int, default=defaults.mp4_connections,
+                        help='число Range-соединений для MP4')
+    parser.add_argument('--transport', choices=['session', 'async'], default=defaults.transport)
+    parser.add_argument('--merge-mode', choices=['pipe', 'ts', 'concat'], default=defaults.merge_mode)
+    parser.add_argument('--memory', action='store_true', help='держать сегменты только в памяти')
+    parser.add_argument('--variant', choices=['best', 'throughput'], default=defaults.variant_selection,
+                        help='выбор варианта мастер-плейлиста: лучшее разрешение или по скорости канала')
+    parser.add_argument('--max-bandwidth', type=parse_rate, default=defaults.max_bandwidth,
+                        metavar='BPS', help='предел битрейта варианта, бит/с (суффиксы K, M, G)')
+    parser.add_argument('--max-height', type=int, default=defaults.max_height,
+                        help='предел высоты кадра варианта, например 720')
+    parser.add_argument('--live', action='store_true',
+                        help='записывать трансляции, пока они идут (до ENDLIST или остановки)')
+    parser.add_argument('--live-duration', type=float, default=defaults.live_duration, metavar='SEC',
+                        help='предел длительности записи трансляции, с')
+    parser.add_argument('--limit-rate', type=parse_rate, default=defaults.rate_limit, metavar='RATE',
+                        help='общий предел скорости, байт/с (суффиксы K, M, G)')
+    parser.add_argument('--job-limit-rate', type=parse_rate, default=defaults.job_rate_limit,
+                        metavar='RATE', help='предел скорости одного видео, байт/с')
+    parser.add_argument('--cache-dir', default=defaults.cache_dir,
+                        help='папка общего кэша сегментов (повторные загрузки без сети)')
+    parser.add_argument('--cache-size', type=parse_rate, default=defaults.cache_size, metavar='SIZE',
+                        help='предел объема кэша, байт (суффиксы K, M, G)')
+    parser.add_argument('--metrics-port', type=int, default=defaults.metrics_port, metavar='PORT',
+                        help='отдавать метрики Prometheus на http://127.0.0.1:PORT/metrics')
+    parser.add_argument('--retries', type=int, default=defaults.max_retries)
+    parser.add_argument('--timeout', type=int, default=defaults.timeout)
+    parser.add_argument('--queue', metavar='FILE',
+                        help='файл SQLite с постоянной очередью; без URL догружает очередь')
+    parser.add_argument('--priority', type=int, default=0, help='приоритет добавляемых заданий')
+    parser.add_argument('--json', action='store_true', help='выводить прогресс строками JSON')
+    parser.add_argument('--progress-interval', type=float, default=0.5,
+                        help='минимальный интервал между событиями прогресса, с')
+    parser.add_argument('--log-level', default='WARNING',
+                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    parser.add_argument('--log-file', metavar='FILE',
+                        help='дублировать журнал в файл (с ротацией по 10 МБ)')
+    parser.add_argument('--log-json', action='store_true', help='журнал строками JSON')
+    return parser
+
+
+class ProgressPrinter:
+    """Вывод событий прогресса с ограничением частоты для каждого задания"""
+    
+    def __init__(self, as_json: bool, interval: float):
+        self.as_json = as_json
+        self.interval = interval
+        self._last = {}
+        self._lock = threading.Lock()
+    
+    def _emit(self, event: dict):
+        with self._lock:
+            if self.as_json:
+                sys.stdout.write(json.dumps(event, ensure_ascii=False) + '\n')
+            elif event['event'] == 'progress':
+                percentage = event['current'] / event['total'] * 100 if event['total'] else 0
+                line = f"[{event['job']}] {event['current']}/{event['total']} ({percentage:.1f}%)"
+                if 'throughput' in event:
+                    line += f" {event['throughput'] / 1048576:.1f} МБ/с x{event['concurrency']}"
+                sys.stdout.write(line + '\n')
+            else:
+                sys.stdout.write(f"[{event['job']}] {event['status']} {event['error']} {event['url']}\n")
+            sys.stdout.flush()
+    
+    def progress(self, job, current: int, total: int, stats: Optional[dict] = None):
+        now = time.monotonic()
+        if current < total and now - self._last.get(job.id, 0.0) < self.interval:
+            return
+        self._last[job.id] = now
+        event = {'event': 'progress', 'job': job.id, 'url': job.url,
+                 'current': current, 'total': total, 'time': time.time()}
+        if stats:
+            event.update(stats)
+        self._emit(event)
+    
+    def finished(self, job):
+        self._emit({'event': 'finished', 'job': job.id, 'url': job.url,
+                    'status': job.status, 'error': job.error, 'time': time.time()})
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.urls and not args.queue:
+        parser.error('укажите URL или --queue')
+    
+    setup_logging(args.log_level, log_file=args.log_file, json_format=args.log_json)
+    
+    # Ядро загрузки импортируется после разбора аргументов: --help не ждет requests
+    from .jobs import JobStore, JobScheduler
+    
+    output_dir = Path(args.output)
+    try:
+        output_dir.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        logging.error(f"Не удалось создать папку {output_dir}: {e}")
+        return EXIT_IO
+    
+    config = DownloadConfig(
+        max_retries=args.retries,
+        timeout=args.timeout,
+        max_workers=args.workers,
+        adaptive_concurrency=not args.fixed_workers,
+        transport=args.transport,
+        mp4_connections=args.connections,
+        merge_mode=args.merge_mode,
+        memory_pipeline=args.memory,
+        variant_selection=args.variant,
+        max_bandwidth=args.max_bandwidth,
+        max_height=args.max_height,
+        live_capture=args.live,
+        live_duration=args.live_duration,
+        rate_limit=args.limit_rate,
+        job_rate_limit=args.job_limit_rate,
+        cache_dir=args.cache_dir,
+        cache_size=args.cache_size,
+        max_jobs=args.parallel,
+        max_jobs_per_host=args.per_host,
+        metrics_port=args.metrics_port,
+    )
+    
+    store = JobStore(Path(args.queue) if args.queue else Path(':memory:'))
+    printer = ProgressPrinter(args.json, args.progress_interval)
+    results = []
+    
+    def on_finished(job):
+        results.append(job)
+        printer.finished(job)
+    
+    scheduler = JobScheduler(config, store, printer.progress, on_finished)
+    for url in args.urls:
+        scheduler.add(url, output_dir, args.priority)
+    
+    interrupted = threading.Event()
+    
+    def on_signal(signum, frame):
+        interrupted.set()
+        scheduler.stop()
+    
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    
+    scheduler.start()
+    try:
+        scheduler.wait()
+    finally:
+        scheduler.close()
+        store.close()
+    
+    if interrupted.is_set():
+        return EXIT_INTERRUPTED
+    # Код первого по порядку неудачного задания
+    for job in sorted(results, key=lambda job: job.id):
+        if job.status != 'done':
+            return FAILURE_EXIT_CODES.get(job.error, EXIT_ERROR)
+    return EXIT_OK
@@ -0,0 +1,91 @@
+"""Адаптивное число одновременных запросов сегментов"""
+import threading
+import time
+
+from .config import DownloadConfig
+
+
+class ConcurrencyController:
+    """AIMD-регулятор числа запросов в полете по измеренной пропускной способности
+    
+    Загрузка делится на окна примерно по limit сегментов. Если в окне не было
+    признаков перегрузки, предел растет на единицу. Временная ошибка сервера
+    (429, 5xx, таймаут) вдвое снижает предел, а рост времени загрузки байта
+    более чем в latency_factor раз от лучшего без прироста скорости снижает
+    его на четверть: лишние запросы только делят канал между собой.
+    """
+    
+    INCREASE_GAIN = 1.05  # Прирост скорости, который считается улучшением
+    
+    def __init__(self, config: DownloadConfig):
+        self.config = config
+        self.max_limit = max(1, config.max_workers)
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        """Начать измерения заново (новый плейлист)"""
+        with self._lock:
+            if self.config.adaptive_concurrency:
+                self.limit = min(self.max_limit, max(1, self.config.initial_concurrency))
+            else:
+                self.limit = self.max_limit
+            self.throughput = 0.0  # байт/с за последнее окно
+            self.latency = 0.0  # среднее время загрузки сегмента за последнее окно, с
+            self._best_cost = 0.0  # лучшее время загрузки байта, с/байт
+            self._window_start = time.monotonic()
+            self._window_bytes = 0
+            self._window_time = 0.0
+            self._window_count = 0
+            self._window_errors = 0
+    
+    def record(self, size: int, elapsed: float):
+        """Учесть успешно загруженный сегмент"""
+        with self._lock:
+            self._window_bytes += size
+            self._window_time += elapsed
+            self._window_count += 1
+            if self._window_count >= self.limit:
+                self._close_window()
+    
+    def record_error(self):
+        """Учесть временную ошибку сервера"""
+        with self._lock:
+            # Снижаем предел не чаще раза за окно: пачка ошибок от одного
+            # перегруженного момента не должна обнулить параллельность
+            if self._window_errors == 0 and self.config.adaptive_concurrency:
+                self.limit = max(1, self.limit // 2)
+            self._window_errors += 1
+    
+    def snapshot(self) -> dict:
+        """Текущие показатели для progress_callback"""
+        with self._lock:
+            return {
+                'concurrency': self.limit,
+                'throughput': self.throughput,
+                'latency': self.latency,
+            }
+    
+    def _close_window(self):
+        now = time.monotonic()
+        elapsed = max(now - self._window_start, 1e-6)
+        throughput = self._window_bytes / elapsed
+        cost = self._window_time / max(self._window_bytes, 1)
+        
+        if self.config.adaptive_concurrency and not self._window_errors:
+            improved = throughput >= self.throughput * self.INCREASE_GAIN
+            if (self._best_cost and cost > self._best_cost * self.config.latency_factor
+                    and not improved):
+                self.limit = max(1, self.limit - max(1, self.limit // 4))
+            elif self.limit < self.max_limit:
+                self.limit += 1
+        
+        if not self._best_cost or cost < self._best_cost:
+            self._best_cost = cost
+        self.throughput = throughput
+        self.latency = self._window_time / self._window_count
+        self._window_start = now
+        self._window_bytes = 0
+        self._window_time = 0.0
+        self._window_count = 0
+        self._window_errors = 0
@@ -0,0 +1,43 @@
+"""Конфигурация загрузчика"""
+from dataclasses import dataclass
+
+
+@dataclass
+class DownloadConfig:
+    """Конфигурация для загрузки"""
+    max_retries: int = 5
+    retry_delay: float = 1  # Базовая задержка экспоненциального повтора, с
+    retry_max_delay: float = 60  # Верхний предел задержки (и Retry-After), с
+    breaker_threshold: int = 5  # Ошибок подряд, после которых хост временно закрывается
+    breaker_cooldown: float = 30  # Время, на которое закрывается деградировавший хост, с
+    timeout: int = 30
+    chunk_size: int = 8192
+    segment_chunk_size: int = 256 * 1024  # Размер куска при потоковой загрузке сегмента
+    segment_timeout: int = 10
+    max_workers: int = 8  # Число параллельно загружаемых сегментов (1 - последовательно)
+    adaptive_concurrency: bool = True  # Подбирать число запросов в полете (не больше max_workers)
+    initial_concurrency: int = 2  # С какого числа запросов начинает адаптивный регулятор
+    latency_factor: float = 2.0  # Рост времени загрузки, который считается перегрузкой
+    transport: str = 'session'  # 'session' (requests.Session) или 'async' (httpx + asyncio)
+    http2: bool = True  # HTTP/2 для асинхронного транспорта (нужен пакет h2)
+    pool_size: int = 0  # Размер пула соединений (0 - по числу соединений одной загрузки)
+    mp4_connections: int = 4  # Число параллельных Range-запросов для MP4 (1 - один поток)
+    range_min_size: int = 8 * 1024 * 1024  # Файлы меньше этого размера качаются одним потоком
+    merge_mode: str = 'pipe'  # 'pipe' (ffmpeg stdin), 'ts' (дописывание в output.ts) или 'concat'
+    memory_pipeline: bool = False  # Держать сегменты только в памяти, без файлов segments/
+    memory_budget: int = 256 * 1024 * 1024  # Предел памяти под буфер сегментов, байт
+    variant_selection: str = 'best'  # Вариант мастер-плейлиста: 'best' (разрешение) или 'throughput'
+    max_bandwidth: int = 0  # Предел битрейта варианта, бит/с (0 - без ограничения)
+    max_height: int = 0  # Предел высоты кадра варианта (0 - без ограничения)
+    live_capture: bool = False  # Записывать трансляции (плейлист без ENDLIST), пока они идут
+    live_duration: float = 0  # Предел длительности записи трансляции, с (0 - до конца или остановки)
+    live_idle_timeout: float = 60  # Запись завершается, если новых сегментов нет столько секунд
+    verify_checksums: bool = False  # При докачке пересчитывать контрольные суммы сегментов
+    rate_limit: int = 0  # Общий предел скорости всех загрузок, байт/с (0 - без ограничения)
+    job_rate_limit: int = 0  # Предел скорости одной загрузки, байт/с (0 - без ограничения)
+    cache_dir: str = ''  # Папка общего кэша сегментов ('' - кэш выключен)
+    cache_size: int = 10 * 1024 ** 3  # Предел объема кэша сегментов, байт
+    metrics_port: int = 0  # Порт HTTP-метрик Prometheus на 127.0.0.1 (0 - выключены)
+    progress_fps: float = 10  # Частота обновления прогресса в GUI, кадров/с
+    max_jobs: int = 2  # Число одновременно выполняемых заданий очереди
+    max_jobs_per_host: int = 1  # Число одновременных заданий к одному хосту
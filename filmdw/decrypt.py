@@ -0,0 +1,109 @@
+"""Расшифровка сегментов HLS (EXT-X-KEY METHOD=AES-128)
+
+Используется пакет cryptography; он импортируется только при первой
+расшифровке. Если пакета нет или метод другой (SAMPLE-AES), загрузчик
+передает плейлист демультиплексору HLS в FFmpeg.
+"""
+import importlib.util
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Optional
+from urllib.parse import urljoin
+
+SUPPORTED_METHOD = 'AES-128'
+
+
+@dataclass(frozen=True)
+class SegmentKey:
+    """Ключ одного сегмента"""
+    method: str
+    uri: str
+    iv: Optional[bytes]  # None - IV выводится из номера сегмента
+    sequence: int = 0
+    keyformat: str = 'identity'
+    
+    @property
+    def supported(self) -> bool:
+        return self.method == SUPPORTED_METHOD and self.keyformat == 'identity'
+    
+    def initialization_vector(self) -> bytes:
+        """IV из атрибута или номер EXT-X-MEDIA-SEQUENCE (RFC 8216, 5.2)"""
+        return self.iv if self.iv is not None else self.sequence.to_bytes(16, 'big')
+
+
+def segment_key(segment, playlist_url: str) -> Optional[SegmentKey]:
+    """Ключ сегмента из плейлиста m3u8 или None для незашифрованного"""
+    key = segment.key
+    if key is None or not key.method or key.method.upper() == 'NONE':
+        return None
+    iv = None
+    if key.iv:
+        iv = bytes.fromhex(key.iv[2:] if key.iv.lower().startswith('0x') else key.iv).rjust(16, b'\0')
+    return SegmentKey(
+        method=key.method.upper(),
+        uri=urljoin(playlist_url, key.uri or ''),
+        iv=iv,
+        sequence=segment.media_sequence or 0,
+        keyformat=(key.keyformat or 'identity').lower(),
+    )
+
+
+def segment_keys(playlist, playlist_url: str) -> list:
+    return [segment_key(segment, playlist_url) for segment in playlist.segments]
+
+
+def decryption_available() -> bool:
+    return importlib.util.find_spec('cryptography') is not None
+
+
+class KeyCache:
+    """Кэш ключей: каждый URI ключа загружается один раз
+    
+    Параллельные запросы одного ключа ждут первой загрузки, а не повторяют ее.
+    Хранится не больше capacity ключей: у трансляций ключи меняются постоянно.
+    """
+    
+    def __init__(self, fetch: Callable[[str], bytes], capacity: int = 256):
+        self.fetch = fetch
+        self.capacity = capacity
+        self._keys = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+    
+    def get(self, uri: str) -> bytes:
+        with self._lock:
+            if uri in self._keys:
+                self._keys.move_to_end(uri)
+                return self._keys[uri]
+            loading = self._loading.setdefault(uri, threading.Lock())
+        
+        with loading:
+            with self._lock:
+                if uri in self._keys:
+                    return self._keys[uri]
+            key = self.fetch(uri)
+            if len(key) != 16:
+                raise ValueError(f"Ключ {uri}: ожидалось 16 байт, получено {len(key)}")
+            with self._lock:
+                self._keys[uri] = key
+                self._loading.pop(uri, None)
+                while len(self._keys) > self.capacity:
+                    self._keys.popitem(last=False)
+            return key
+
+
+class StreamDecryptor:
+    """Потоковая расшифровка AES-128-CBC с PKCS7 по мере поступления данных"""
+    
+    def __init__(self, key: bytes, iv: bytes):
+        from cryptography.hazmat.primitives import padding
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        self._decryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).decryptor()
+        self._unpadder = padding.PKCS7(128).unpadder()
+    
+    def update(self, data: bytes) -> bytes:
+        return self._unpadder.update(self._decryptor.update(data))
+    
+    def finalize(self) -> bytes:
+        return self._unpadder.update(self._decryptor.finalize()) + self._unpadder.finalize()
@@ -0,0 +1,1425 @@
+"""Загрузка M3U8 и MP4 видео
+
+requests и m3u8 импортируются внутри методов: их загрузка откладывается
+до первой реальной загрузки видео.
+"""
+import heapq
+import logging
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Callable
+from urllib.parse import urljoin, urlparse
+
+from .cache import CacheEntry, SegmentCache, link_file, new_digest
+from .concurrency import ConcurrencyController
+from .config import DownloadConfig
+from .decrypt import (KeyCache, SegmentKey, StreamDecryptor, decryption_available,
+                      segment_key, segment_keys)
+from .manager import DownloadManager
+from .layout import JobLock, video_id
+from .live import LivePlaylist, LiveWindow
+from .merge import FFMPEG_TIMEOUT, StreamingMerger, ReorderBuffer
+from .metrics import DownloadMetrics
+from .resume import ResumeJournal, SegmentManifest
+from .ratelimit import BandwidthLimiter, TokenBucket
+from .retry import RetryLater, RetryPolicy, CircuitBreakers
+from .transport import HttpTransport, RequestHandle, create_transport
+from .variants import (THROUGHPUT_CHUNK_SIZE, THROUGHPUT_SAMPLE_BYTES, THROUGHPUT_SAMPLE_SEGMENTS,
+                       select_renditions, select_variant, variant_bandwidth)
+
+
+class VideoDownloader:
+    """Класс для загрузки видео
+    
+    После неудачной загрузки в failure записан класс ошибки:
+    'network', 'playlist', 'merge', 'io', 'format', 'busy', 'stopped' или 'error'.
+    """
+    
+    def __init__(self, config: DownloadConfig, transport: Optional[HttpTransport] = None,
+                 circuit_breakers: Optional[CircuitBreakers] = None,
+                 bandwidth: Optional[TokenBucket] = None,
+                 segment_cache: Optional[SegmentCache] = None,
+                 metrics: Optional[DownloadMetrics] = None):
+        self.config = config
+        self.download_manager = DownloadManager(config)
+        self.failure = ''
+        self.retries = 0  # Повторных запросов за время жизни загрузчика (для панели заданий)
+        self.retry_policy = RetryPolicy(config)
+        # Выключатели хостов можно разделить между несколькими загрузками
+        self.circuit_breakers = circuit_breakers or CircuitBreakers(config)
+        self.concurrency = ConcurrencyController(config)
+        self.key_cache = KeyCache(self._fetch_key)
+        # Общая корзина скорости передается планировщиком очереди
+        self.bandwidth = BandwidthLimiter(bandwidth or TokenBucket(config.rate_limit),
+                                          TokenBucket(config.job_rate_limit))
+        # Общий транспорт (например, у заданий очереди) закрывает его владелец
+        self._owns_transport = transport is None
+        self.transport = transport if transport is not None else create_transport(config)
+        # Кэш сегментов: общий передается планировщиком, иначе свой при cache_dir
+        self._owns_cache = segment_cache is None and bool(config.cache_dir)
+        if self._owns_cache:
+            segment_cache = SegmentCache(Path(config.cache_dir), config.cache_size)
+        self.segment_cache = segment_cache
+        # Метрики горячего пути; планировщик передает общие для всех заданий
+        self.metrics = metrics or DownloadMetrics()
+    
+    def close(self):
+        """Освобождение соединений транспорта и кэша"""
+        if self._owns_transport:
+            self.transport.close()
+        if self._owns_cache:
+            self.segment_cache.close()
+    
+    @contextmanager
+    def _request(self, url: str, timeout: float, stream: bool = False,
+                 headers: Optional[dict] = None):
+        """GET, который остановка загрузки прерывает на любом этапе
+        
+        И ожидание заголовков, и чтение тела; ответ закрывается на выходе из блока.
+        """
+        handle = RequestHandle()
+        with self.download_manager.track(handle.interrupt):
+            response = self.transport.get(url, timeout=timeout, stream=stream,
+                                          headers=headers, handle=handle)
+            with response:
+                yield response
+    
+    def download(self, url: str, output_dir: Path,
+                 progress_callback: Optional[Callable] = None) -> bool:
+        """Загрузка видео с выбором способа по расширению URL"""
+        file_extension = Path(urlparse(url).path).suffix.lower()
+        if file_extension == '.m3u8':
+            success = self.download_m3u8_video(url, output_dir, progress_callback)
+        elif file_extension == '.mp4':
+            success = self.download_mp4_video(url, output_dir, progress_callback)
+        else:
+            logging.error(f"Неподдерживаемый формат: {url}")
+            self.failure = 'format'
+            return False
+        
+        if not success:
+            if self.download_manager.is_stopped:
+                self.failure = 'stopped'
+            elif not self.failure:
+                self.failure = 'error'
+        return success
+    
+    def set_rate_limit(self, rate: int):
+        """Изменить предел скорости этой загрузки на лету, байт/с (0 - без ограничения)"""
+        self.bandwidth.own.set_rate(rate)
+    
+    def _throttle(self, size: int) -> bool:
+        """Учесть полученные байты в лимитах скорости; False, если загрузка остановлена
+        
+        Лимиты списываются порциями (см. BandwidthLimiter), хвост порции
+        списывается в конце запроса. Метрика download_bytes тоже считается
+        раз на сегмент или запрос диапазона, а не на каждый кусок.
+        """
+        return self.bandwidth.consume(size, self.download_manager.sleep)
+    
+    def _fail(self, failure: str, error: Optional[Exception] = None) -> bool:
+        """Запомнить класс ошибки (первая ошибка важнее последующих)"""
+        import requests
+        if error is not None:
+            if isinstance(error, requests.exceptions.RequestException):
+                failure = 'network'
+            elif isinstance(error, OSError):
+                failure = 'io'
+        if not self.failure:
+            self.failure = failure
+        return False
+        
+    def download_segment(self, segment_url: str, segment_file: Path, 
+                        segment_index: int, total_segments: int,
+                        manifest: Optional[SegmentManifest] = None,
+                        attempt: Optional[int] = None,
+                        key: Optional[SegmentKey] = None,
+                        use_cache: bool = True) -> bool:
+        """Потоковая загрузка одного сегмента в файл с повторными попытками
+        
+        Тело пишется во временный segment_XXXX.ts.part и переименовывается
+        только после полной и проверенной загрузки, поэтому оборванная запись
+        никогда не выглядит готовым сегментом. Готовый сегмент записывается
+        в манифест вместе с контрольной суммой. Зашифрованный сегмент (key)
+        расшифровывается по мере получения, на диск попадает уже открытый текст.
+        Если включен кэш сегментов, сегмент сначала ищется в нем
+        (use_cache=False - мимо кэша); запись с валидаторами проверяется
+        условным запросом.
+        """
+        if manifest is None and segment_file.exists():
+            logging.info("Сегмент %d/%d: уже загружен", segment_index + 1, total_segments,
+                         extra={'sample': 'segment_skip'})
+            return True
+        
+        cache = self.segment_cache if use_cache else None
+        entry = cache.lookup(segment_url) if cache is not None else None
+        conditional = entry.conditional_headers() if entry is not None else {}
+        if entry is not None and not conditional:
+            logging.info("Сегмент %d/%d: из кэша", segment_index + 1, total_segments,
+                         extra={'sample': 'segment_cache'})
+            self.metrics.segments.inc(result='cache')
+            self._place_cached(entry.path, segment_file, segment_index, segment_url, manifest)
+            return True
+        
+        part_file = segment_file.with_name(segment_file.name + '.part')
+        
+        def consume(response) -> Optional[int]:
+            if response.status_code == 304:
+                cached = self._revalidated(entry, conditional, segment_index, total_segments)
+                return self._place_cached(cached, segment_file, segment_index,
+                                          segment_url, manifest)
+            if cache is not None and key is None:
+                # Тот же объект под другим URL: тело не читаем
+                cached = cache.lookup_etag(segment_url, response.headers)
+                if cached is not None:
+                    return self._place_cached(cached, segment_file, segment_index,
+                                              segment_url, manifest)
+            
+            written = 0
+            checksum = manifest.new_checksum() if manifest is not None else None
+            digest = new_digest() if cache is not None else None
+            with open(part_file, 'wb', buffering=0) as f:
+                for chunk in self._segment_chunks(response, key):
+                    f.write(chunk)
+                    written += len(chunk)
+                    if checksum is not None:
+                        checksum.update(chunk)
+                    if digest is not None:
+                        digest.update(chunk)
+            if self.download_manager.is_stopped:
+                return None
+            part_file.replace(segment_file)
+            if manifest is not None:
+                manifest.record(segment_index, segment_url, written,
+                                response.headers.get('content-length'),
+                                checksum.hexdigest() if checksum is not None else '')
+            if digest is not None:
+                cache.store(segment_url, segment_file, digest.hexdigest(), response.headers)
+            return written
+        
+        return self._request_segment(segment_url, segment_index, total_segments, consume, attempt,
+                                     conditional)
+    
+    def _revalidated(self, entry: CacheEntry, conditional: dict,
+                     segment_index: int, total_segments: int) -> Path:
+        """Объект записи кэша, которую сервер подтвердил ответом 304
+        
+        Если объект вытеснен, пока шел запрос, условие снимается и запрос
+        повторяется как обычная ошибка соединения.
+        """
+        import requests
+        cached = self.segment_cache.revalidated(entry)
+        if cached is None:
+            conditional.clear()
+            raise requests.exceptions.ConnectionError("Объект кэша удален во время проверки")
+        logging.info("Сегмент %d/%d: не изменился, из кэша", segment_index + 1, total_segments,
+                     extra={'sample': 'segment_cache'})
+        return cached
+    
+    def _place_cached(self, cached: Path, segment_file: Path, segment_index: int,
+                      segment_url: str, manifest: Optional[SegmentManifest]) -> int:
+        """Поместить объект кэша на место файла сегмента; возвращает размер"""
+        link_file(cached, segment_file)
+        size = segment_file.stat().st_size
+        if manifest is not None:
+            checksum = manifest.new_checksum()
+            if checksum is not None:
+                with open(segment_file, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        checksum.update(chunk)
+            manifest.record(segment_index, segment_url, size, None,
+                            checksum.hexdigest() if checksum is not None else '')
+        return size
+    
+    def fetch_segment(self, segment_url: str, segment_index: int,
+                      total_segments: int, attempt: Optional[int] = None,
+                      key: Optional[SegmentKey] = None,
+                      use_cache: bool = True,
+                      abort: Optional[threading.Event] = None) -> Optional[bytearray]:
+        """Загрузка содержимого сегмента в память с повторными попытками
+        
+        Буфер выделяется один раз по Content-Length и заполняется кусками.
+        Если включен кэш сегментов, сегмент сначала ищется в нем
+        (use_cache=False - мимо кэша); запись с валидаторами проверяется
+        условным запросом. abort прекращает повторы (см. _request_segment).
+        """
+        cache = self.segment_cache if use_cache else None
+        entry = cache.lookup(segment_url) if cache is not None else None
+        conditional = entry.conditional_headers() if entry is not None else {}
+        if entry is not None and not conditional:
+            self.metrics.segments.inc(result='cache')
+            return bytearray(entry.path.read_bytes())
+        
+        result = []
+        
+        def consume(response) -> Optional[int]:
+            if response.status_code == 304:
+                cached = self._revalidated(entry, conditional, segment_index, total_segments)
+                result.append(bytearray(cached.read_bytes()))
+                return len(result[0])
+            if cache is not None and key is None:
+                cached = cache.lookup_etag(segment_url, response.headers)
+                if cached is not None:
+                    result.append(bytearray(cached.read_bytes()))
+                    return len(result[0])
+            
+            data = bytearray(int(response.headers.get('content-length') or 0))
+            written = 0
+            for chunk in self._segment_chunks(response, key):
+                data[written:written + len(chunk)] = chunk
+                written += len(chunk)
+            if self.download_manager.is_stopped:
+                return None
+            del data[written:]
+            if cache is not None:
+                cache.store_bytes(segment_url, data, response.headers)
+            result.append(data)
+            return written
+        
+        if not self._request_segment(segment_url, segment_index, total_segments, consume, attempt,
+                                     conditional, abort):
+            return None
+        return result[0]
+    
+    def _segment_chunks(self, response, key: Optional[SegmentKey] = None):
+        """Куски тела сегмента с учетом лимита скорости и расшифровкой
+        
+        Прекращается при остановке загрузки; после полного тела проверяет
+        Content-Length по числу полученных (зашифрованных) байт.
+        """
+        decryptor = None
+        if key is not None:
+            decryptor = StreamDecryptor(self.key_cache.get(key.uri), key.initialization_vector())
+        
+        received = 0
+        try:
+            for chunk in response.iter_content(chunk_size=self.config.segment_chunk_size):
+                if self.download_manager.is_stopped or not self._throttle(len(chunk)):
+                    return
+                received += len(chunk)
+                yield decryptor.update(chunk) if decryptor is not None else chunk
+        finally:
+            self.bandwidth.release(self.download_manager.sleep)
+            self.metrics.download_bytes.inc(received)
+        self._check_length(response, received)
+        if decryptor is not None:
+            yield decryptor.finalize()
+    
+    def _fetch_key(self, uri: str) -> bytes:
+        """Загрузка ключа расшифровки (ошибки обрабатывает повтор сегмента)"""
+        logging.info(f"Загружаем ключ {uri}")
+        with self._request(uri, self.config.timeout) as response:
+            response.raise_for_status()
+            return response.content
+    
+    @staticmethod
+    def _check_length(response, received: int):
+        """Проверка, что тело ответа получено полностью"""
+        import requests
+        expected = response.headers.get('content-length')
+        if expected and not response.headers.get('content-encoding') and int(expected) != received:
+            raise requests.exceptions.ChunkedEncodingError(
+                f"Получено {received} из {expected} байт"
+            )
+    
+    def _request_segment(self, segment_url: str, segment_index: int, total_segments: int,
+                         consume: Callable, attempt: Optional[int] = None,
+                         headers: Optional[dict] = None,
+                         abort: Optional[threading.Event] = None) -> bool:
+        """Запрос сегмента; тело передается в consume(response)
+        
+        consume возвращает число полученных байт или None при остановке.
+        headers - дополнительные заголовки запроса (условие проверки кэша).
+        abort - событие отмены всей загрузки: после него новые попытки
+        не начинаются, а задержка перед повтором обрывается.
+        Без attempt временные ошибки повторяются прямо в этом потоке.
+        С attempt (номер попытки от нуля) делается одна попытка, а временная
+        ошибка выбрасывается как RetryLater, чтобы планировщик вернул сегмент
+        в очередь и не держал поток на время задержки.
+        """
+        if attempt is not None:
+            return self._attempt_segment(segment_url, segment_index, total_segments,
+                                         consume, attempt, headers)
+        
+        for attempt in range(self.config.max_retries):
+            if abort is not None and abort.is_set():
+                return False
+            try:
+                return self._attempt_segment(segment_url, segment_index, total_segments,
+                                             consume, attempt, headers)
+            except RetryLater as e:
+                if not self._backoff(e.delay, abort):
+                    return False
+        
+        logging.error(f"Не удалось загрузить сегмент {segment_url} после {self.config.max_retries} попыток")
+        return self._fail('network')
+    
+    def _backoff(self, delay: float, abort: Optional[threading.Event]) -> bool:
+        """Задержка перед повтором; False, если загрузка остановлена или отменена"""
+        if abort is None:
+            return self.download_manager.sleep(delay)
+        # Остановка тоже взводит abort и будит ожидание
+        with self.download_manager.track(abort.set):
+            return not abort.wait(delay)
+    
+    def _attempt_segment(self, segment_url: str, segment_index: int, total_segments: int,
+                         consume: Callable, attempt: int, headers: Optional[dict] = None) -> bool:
+        """Одна попытка загрузки сегмента через слот выключателя хоста"""
+        import requests
+        
+        self.download_manager.wait_if_paused()
+        
+        with self.circuit_breakers.slot(segment_url, self.download_manager) as outcome:
+            if outcome is None or self.download_manager.is_stopped:
+                return False
+            
+            # Частые записи с sample форматируются лениво: отброшенные фильтром
+            # прореживания не стоят форматирования строки
+            logging.info("Загружаем сегмент %d/%d: %s", segment_index + 1, total_segments,
+                         segment_url, extra={'sample': 'segment_start'})
+            metrics = self.metrics
+            started = time.monotonic()
+            try:
+                with metrics.active_connections.track():
+                    with self._request(segment_url, self.config.segment_timeout, stream=True,
+                                       headers=headers) as response:
+                        metrics.segment_ttfb.observe(time.monotonic() - started)
+                        response.raise_for_status()
+                        size = consume(response)
+                if size is None:
+                    return False
+                outcome[0] = True
+                elapsed = time.monotonic() - started
+                self.concurrency.record(size, elapsed)
+                metrics.segment_seconds.observe(elapsed)
+                metrics.segments.inc(result='ok')
+                return True
+            
+            except requests.exceptions.RequestException as e:
+                if self.download_manager.is_stopped:
+                    return False
+                if not self.retry_policy.is_retryable(e):
+                    logging.error(f"Ошибка загрузки сегмента {segment_url}: {e}")
+                    metrics.segments.inc(result='error')
+                    return self._fail('network')
+                
+                outcome[0] = False
+                self.concurrency.record_error()
+                if attempt + 1 >= self.config.max_retries:
+                    logging.error(f"Не удалось загрузить сегмент {segment_url} "
+                                  f"после {self.config.max_retries} попыток: {e}")
+                    metrics.segments.inc(result='error')
+                    return self._fail('network')
+                
+                delay = self.retry_policy.delay(attempt, e)
+                self.retries += 1
+                metrics.retries.inc(cause=self.retry_policy.cause(e))
+                logging.warning("Ошибка загрузки сегмента %s: %s. Попытка %d/%d, повтор через %.1f с",
+                                segment_url, e, attempt + 1, self.config.max_retries, delay,
+                                extra={'sample': 'segment_retry'})
+                raise RetryLater(delay, e) from e
+    
+    def _fetch_to_buffer(self, segment_url: str, segment_index: int,
+                         total_segments: int, buffer: 'ReorderBuffer',
+                         attempt: Optional[int] = None,
+                         key: Optional[SegmentKey] = None,
+                         use_cache: bool = True,
+                         abort: Optional[threading.Event] = None) -> bool:
+        """Загрузка сегмента в буфер переупорядочивания (без записи на диск)"""
+        data = self.fetch_segment(segment_url, segment_index, total_segments, attempt, key,
+                                  use_cache, abort)
+        if data is None:
+            return False
+        return buffer.put(segment_index, data)
+    
+    def download_m3u8_video(self, playlist_url: str, output_dir: Path, 
+                           progress_callback: Optional[Callable] = None) -> bool:
+        """Загрузка M3U8 видео
+        
+        Для мастер-плейлиста выбирается вариант качества (см. variants.py);
+        отдельные дорожки звука и субтитров загружаются параллельно с видео
+        и сводятся с ним в output.mp4.
+        """
+        self.failure = ''
+        try:
+            # Получаем ID видео из URL
+            video_id = self._extract_video_id(playlist_url)
+            logging.info(f"ID видео: {video_id}")
+            
+            # Создаем структуру папок
+            video_dir = output_dir / video_id
+            video_dir.mkdir(parents=True, exist_ok=True)
+            
+            with JobLock(video_dir) as locked:
+                if not locked:
+                    return self._busy(video_dir)
+                # Загружаем плейлист
+                m3u8_obj = self._load_playlist(playlist_url)
+                renditions = []
+                if m3u8_obj.is_variant:
+                    resolved = self._resolve_master(playlist_url, m3u8_obj)
+                    if resolved is None:
+                        return self._fail('playlist')
+                    playlist_url, m3u8_obj, renditions = resolved
+                self.concurrency.reset()
+                
+                is_live = (not m3u8_obj.is_endlist
+                           and (m3u8_obj.playlist_type or '').lower() != 'vod')
+                if is_live:
+                    if self.config.live_capture:
+                        if renditions:
+                            logging.warning("Отдельные дорожки трансляции не записываются")
+                        segments_dir = video_dir / 'segments'
+                        return self._capture_live(playlist_url, video_dir, segments_dir,
+                                                  m3u8_obj, progress_callback)
+                    logging.warning("Плейлист трансляции: загружаются только уже доступные сегменты")
+                
+                if not renditions:
+                    return self._download_media(playlist_url, m3u8_obj, video_dir,
+                                                progress_callback) is not None
+                return self._download_with_renditions(playlist_url, m3u8_obj, renditions,
+                                                      video_dir, progress_callback)
+            
+        except Exception as e:
+            if self.download_manager.is_stopped:
+                # Остановка обрывает запросы в полете; это не ошибка загрузки
+                return self._fail('stopped')
+            logging.error(f"Ошибка при загрузке M3U8 видео: {e}")
+            return self._fail('error', e)
+    
+    def _load_playlist(self, playlist_url: str):
+        """Загрузка и разбор плейлиста"""
+        import m3u8
+        with self._request(playlist_url, self.config.timeout) as response:
+            response.raise_for_status()
+            return m3u8.loads(response.text)
+    
+    def _resolve_master(self, master_url: str, master) -> Optional[tuple]:
+        """Выбор варианта мастер-плейлиста
+        
+        Возвращает (URL медиаплейлиста, медиаплейлист, дорожки) или None.
+        """
+        throughput = 0.0
+        if self.config.variant_selection == 'throughput':
+            throughput = self._measure_throughput(master_url, master)
+        
+        variant = select_variant(master, self.config, throughput)
+        if variant is None:
+            logging.error("Мастер-плейлист не содержит вариантов")
+            return None
+        resolution = variant.stream_info.resolution
+        logging.info(f"Выбран вариант {'x'.join(map(str, resolution)) if resolution else '-'} "
+                     f"{variant_bandwidth(variant) // 1000} кбит/с: {variant.uri}")
+        
+        media_url = urljoin(master_url, variant.uri)
+        renditions = [(media.type, media.language or media.name or media.group_id,
+                       urljoin(master_url, media.uri), media.language or '')
+                      for media in select_renditions(master, variant)]
+        return media_url, self._load_playlist(media_url), renditions
+    
+    def _measure_throughput(self, master_url: str, master) -> float:
+        """Скорость канала, байт/с, по первым сегментам самого легкого варианта
+        
+        Время считается от первого куска тела каждого ответа: установка
+        соединения и ожидание заголовков говорят о задержке, а не о скорости.
+        Если замер не удался, возвращает 0, и выбор идет только по пределам.
+        """
+        import requests
+        variants = [playlist for playlist in master.playlists if playlist.stream_info]
+        if not variants:
+            return 0.0
+        try:
+            lightest = min(variants, key=variant_bandwidth)
+            media_url = urljoin(master_url, lightest.uri)
+            media = self._load_playlist(media_url)
+            if not media.segments:
+                return 0.0
+            received = 0
+            elapsed = 0.0
+            for segment in media.segments[:THROUGHPUT_SAMPLE_SEGMENTS]:
+                with self._request(urljoin(media_url, segment.uri),
+                                   self.config.segment_timeout, stream=True) as response:
+                    response.raise_for_status()
+                    first_byte = None
+                    for chunk in response.iter_content(chunk_size=THROUGHPUT_CHUNK_SIZE):
+                        if first_byte is None:
+                            first_byte = time.monotonic()
+                        else:
+                            received += len(chunk)
+                    if first_byte is not None:
+                        elapsed += time.monotonic() - first_byte
+                if received >= THROUGHPUT_SAMPLE_BYTES:
+                    break
+            if not received:
+                logging.warning("Не удалось измерить скорость: сегменты слишком малы")
+                return 0.0
+            throughput = received / max(elapsed, 1e-3)
+            logging.info(f"Измеренная скорость: {throughput * 8 / 1e6:.1f} Мбит/с")
+            return throughput
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"Не удалось измерить скорость: {e}")
+            return 0.0
+    
+    def _download_media(self, playlist_url: str, m3u8_obj, video_dir: Path,
+                        progress_callback: Optional[Callable] = None,
+                        merge_mode: Optional[str] = None) -> Optional[Path]:
+        """Загрузка медиаплейлиста в video_dir; возвращает путь к результату"""
+        total_segments = len(m3u8_obj.segments)
+        if total_segments == 0:
+            logging.error("Плейлист не содержит сегментов")
+            self._fail('playlist')
+            return None
+        
+        video_dir.mkdir(parents=True, exist_ok=True)
+        keys = segment_keys(m3u8_obj, playlist_url)
+        if any(keys):
+            unsupported = next((key for key in keys if key is not None and not key.supported), None)
+            if unsupported is not None or not decryption_available():
+                reason = (f"метод {unsupported.method} ({unsupported.keyformat})" if unsupported
+                          else "пакет cryptography не установлен")
+                logging.warning(f"Расшифровка сегментов недоступна: {reason}, "
+                                f"плейлист передается FFmpeg")
+                return self._download_with_ffmpeg(playlist_url, video_dir)
+        else:
+            keys = None
+        
+        segments_dir = video_dir / 'segments'
+        if not self.config.memory_pipeline:
+            segments_dir.mkdir(exist_ok=True)
+        
+        # Загружаем сегменты
+        segment_urls = [urljoin(playlist_url, segment.uri) for segment in m3u8_obj.segments]
+        
+        merge_mode = merge_mode or self.config.merge_mode
+        if self.config.memory_pipeline and merge_mode == 'concat':
+            logging.warning("Режим concat требует файлов сегментов, используется 'pipe'")
+            merge_mode = 'pipe'
+        
+        if merge_mode == 'concat':
+            if not self._download_segments(segment_urls, segments_dir, progress_callback, keys=keys):
+                return None
+            # Объединяем сегменты
+            with self.metrics.merge_seconds.time(mode='concat'):
+                merged = self._merge_segments(video_dir, segments_dir, total_segments)
+            if not merged:
+                self._fail('merge')
+                return None
+            return video_dir / 'output.mp4'
+        
+        # Склеиваем сегменты по мере загрузки
+        merger = StreamingMerger(video_dir, segments_dir, total_segments, merge_mode)
+        if merger.output_path.exists():
+            logging.info(f"Выходной файл уже существует: {merger.output_path}")
+            return merger.output_path
+        
+        success = False
+        try:
+            start_index = merger.open()
+            if self.config.memory_pipeline:
+                success = self._download_segments_to_memory(
+                    segment_urls, merger, start_index, progress_callback, keys
+                )
+            else:
+                success = self._download_segments(segment_urls, segments_dir, progress_callback,
+                                                  on_segment=merger.add, start_index=start_index,
+                                                  keys=keys)
+            if success:
+                with self.metrics.merge_seconds.time(mode=merge_mode):
+                    with self.download_manager.track(merger.interrupt):
+                        merged = merger.finish()
+                if not merged:
+                    self._fail('merge')
+                    return None
+            return merger.output_path if success else None
+        finally:
+            if not success:
+                merger.abort()
+    
+    def _download_with_ffmpeg(self, playlist_url: str, video_dir: Path) -> Optional[Path]:
+        """Загрузка плейлиста демультиплексором HLS в FFmpeg
+        
+        FFmpeg сам загружает ключи и расшифровывает SAMPLE-AES, но без
+        параллельной загрузки, докачки и прогресса.
+        """
+        output_path = video_dir / 'output.mp4'
+        if output_path.exists():
+            logging.info(f"Выходной файл уже существует: {output_path}")
+            return output_path
+        if shutil.which('ffmpeg') is None:
+            logging.error("FFmpeg не найден, зашифрованный плейлист не может быть загружен")
+            self._fail('format')
+            return None
+        
+        part_path = output_path.with_name(output_path.name + '.part')
+        returncode, stderr = self._run_ffmpeg(['-loglevel', 'error', '-nostats', '-i', playlist_url,
+                                               '-c', 'copy', '-f', 'mp4', '-y', str(part_path)],
+                                              timeout=None)
+        if returncode != 0:
+            part_path.unlink(missing_ok=True)
+            if not self.download_manager.is_stopped:
+                logging.error(f"Ошибка FFmpeg: {stderr}")
+                self._fail('merge')
+            return None
+        part_path.replace(output_path)
+        logging.info(f"Видео загружено через FFmpeg: {output_path}")
+        return output_path
+    
+    def _download_with_renditions(self, playlist_url: str, m3u8_obj, renditions: list,
+                                  video_dir: Path,
+                                  progress_callback: Optional[Callable] = None) -> bool:
+        """Видео и отдельные дорожки параллельно, затем сведение в output.mp4
+        
+        Каждая дорожка качается в свою подпапку (video, audio-en, subtitles-ru)
+        и докачивается независимо от остальных.
+        """
+        output_path = video_dir / 'output.mp4'
+        if output_path.exists():
+            logging.info(f"Выходной файл уже существует: {output_path}")
+            return True
+        
+        tracks = {}
+        
+        def download_track(kind: str, name: str, url: str):
+            track_dir = video_dir / f"{kind.lower()}-{self._safe_name(name)}"
+            try:
+                playlist = self._load_playlist(url)
+                if kind == 'SUBTITLES':
+                    tracks[(kind, name)] = self._download_subtitles(url, playlist, track_dir)
+                else:
+                    # Аудио может быть в TS или в виде AAC-пакетов: склеиваем побайтно
+                    tracks[(kind, name)] = self._download_media(url, playlist, track_dir,
+                                                                merge_mode='ts')
+            except Exception as e:
+                logging.error(f"Ошибка загрузки дорожки {kind} {name}: {e}")
+                tracks[(kind, name)] = None
+        
+        threads = [threading.Thread(target=download_track, args=rendition[:3],
+                                    name=f'rendition-{rendition[0].lower()}', daemon=True)
+                   for rendition in renditions]
+        for thread in threads:
+            thread.start()
+        video_path = self._download_media(playlist_url, m3u8_obj, video_dir / 'video',
+                                          progress_callback)
+        for thread in threads:
+            thread.join()
+        if video_path is None:
+            return False
+        
+        inputs = []
+        for kind, name, _, language in renditions:
+            path = tracks.get((kind, name))
+            if path is not None:
+                inputs.append((kind, language, path))
+            elif kind == 'SUBTITLES':
+                logging.warning(f"Субтитры {name} не загружены, видео сводится без них")
+            else:
+                logging.error(f"Дорожка {kind} {name} не загружена")
+                return self._fail(self.failure or 'network')
+        
+        with self.metrics.merge_seconds.time(mode='mux'):
+            muxed = self._mux_renditions(video_path, inputs, output_path)
+        if not muxed:
+            return self._fail('merge')
+        shutil.rmtree(video_path.parent, ignore_errors=True)
+        for _, _, path in inputs:
+            shutil.rmtree(path.parent, ignore_errors=True)
+        return True
+    
+    def _download_subtitles(self, playlist_url: str, m3u8_obj, track_dir: Path) -> Optional[Path]:
+        """Загрузка сегментов WebVTT и склейка в один output.vtt"""
+        output_path = track_dir / 'output.vtt'
+        if output_path.exists():
+            return output_path
+        segments_dir = track_dir / 'segments'
+        segments_dir.mkdir(parents=True, exist_ok=True)
+        segment_urls = [urljoin(playlist_url, segment.uri) for segment in m3u8_obj.segments]
+        if not segment_urls or not self._download_segments(segment_urls, segments_dir):
+            return None
+        
+        part_path = output_path.with_name(output_path.name + '.part')
+        with open(part_path, 'w', encoding='utf-8') as out:
+            out.write('WEBVTT\n\n')
+            for index in range(len(segment_urls)):
+                text = (segments_dir / f'segment_{index:04d}.ts').read_text(encoding='utf-8-sig')
+                # Заголовок каждого сегмента (WEBVTT, X-TIMESTAMP-MAP) - до первой пустой строки
+                header, _, cues = text.replace('\r\n', '\n').partition('\n\n')
+                if not header.startswith('WEBVTT'):
+                    cues = text
+                if cues.strip():
+                    out.write(cues.strip('\n') + '\n\n')
+        part_path.replace(output_path)
+        shutil.rmtree(segments_dir, ignore_errors=True)
+        (track_dir / 'manifest.json').unlink(missing_ok=True)
+        return output_path
+    
+    def _mux_renditions(self, video_path: Path, inputs: list, output_path: Path) -> bool:
+        """Сведение видео с дорожками звука и субтитров в output.mp4 через FFmpeg
+        
+        inputs - (тип, язык, путь); язык записывается в метаданные дорожки,
+        если плейлист его указал.
+        """
+        if shutil.which('ffmpeg') is None:
+            logging.error("FFmpeg не найден: дорожки не сведены, файлы оставлены в "
+                          f"{video_path.parent.parent}")
+            return False
+        
+        part_path = output_path.with_name(output_path.name + '.part')
+        ffmpeg_cmd = ['-loglevel', 'error', '-i', str(video_path)]
+        maps = ['-map', '0:v', '-map', '0:a?']
+        metadata = []
+        # Если в видео уже есть звук, дорожки из плейлиста идут после него
+        streams = {'AUDIO': self._count_audio_streams(video_path), 'SUBTITLES': 0}
+        for number, (kind, language, path) in enumerate(inputs, start=1):
+            ffmpeg_cmd += ['-i', str(path)]
+            stream = 'a' if kind == 'AUDIO' else 's'
+            maps += ['-map', f'{number}:{stream}']
+            if language:
+                metadata += [f'-metadata:s:{stream}:{streams[kind]}', f'language={language}']
+            streams[kind] += 1
+        ffmpeg_cmd += maps + ['-c', 'copy', '-c:s', 'mov_text'] + metadata
+        ffmpeg_cmd += ['-f', 'mp4', '-y', str(part_path)]
+        
+        result = self._run_ffmpeg(ffmpeg_cmd)
+        if result is None:
+            logging.error("Таймаут при сведении дорожек")
+            part_path.unlink(missing_ok=True)
+            return False
+        if result[0] != 0:
+            if not self.download_manager.is_stopped:
+                logging.error(f"Ошибка FFmpeg: {result[1]}")
+            part_path.unlink(missing_ok=True)
+            return False
+        part_path.replace(output_path)
+        logging.info(f"Видео и дорожки сведены: {output_path}")
+        return True
+    
+    def _count_audio_streams(self, path: Path) -> int:
+        """Число звуковых потоков в файле по описанию входа из ffmpeg -i"""
+        result = self._run_ffmpeg(['-hide_banner', '-i', str(path)], timeout=60)
+        if result is None:
+            logging.warning(f"Таймаут при чтении потоков {path}")
+            return 0
+        return sum(1 for line in result[1].splitlines()
+                   if line.lstrip().startswith('Stream #0:') and ': Audio:' in line)
+    
+    def _run_ffmpeg(self, args: list, timeout: Optional[float] = FFMPEG_TIMEOUT) -> Optional[tuple]:
+        """Запуск ffmpeg, который остановка загрузки сразу прерывает
+        
+        Возвращает (код возврата, stderr) или None, если истек timeout.
+        """
+        process = subprocess.Popen(['ffmpeg', *args], stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        with self.download_manager.track(process.kill):
+            try:
+                _, stderr = process.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                return None
+        return process.returncode, stderr.decode(errors='replace')
+    
+    @staticmethod
+    def _safe_name(name: str) -> str:
+        """Имя дорожки, пригодное для имени папки"""
+        return ''.join(c if c.isalnum() or c in '-_' else '_' for c in name) or 'track'
+    
+    def _capture_live(self, playlist_url: str, video_dir: Path, segments_dir: Path,
+                      m3u8_obj, progress_callback: Optional[Callable] = None) -> bool:
+        """Запись трансляции до EXT-X-ENDLIST, остановки, live_duration или простоя
+        
+        Плейлист перезагружается с периодом целевой длительности сегмента,
+        новые сегменты идут через буфер в памяти прямо в склейку, и выходной
+        файл растет по мере записи. Остановка завершает запись: склеенная
+        часть сохраняется как готовое видео.
+        """
+        merge_mode = 'pipe' if self.config.merge_mode == 'concat' else self.config.merge_mode
+        merger = StreamingMerger(video_dir, segments_dir, 0, merge_mode)
+        playlist = LivePlaylist()
+        started = last_new = time.monotonic()
+        logging.info(f"Запись трансляции: {playlist_url}")
+        
+        success = False
+        try:
+            window = LiveWindow(merger.open())
+            keys = LiveWindow(window.base)
+            while True:
+                poll_started = time.monotonic()
+                new_segments = playlist.update(m3u8_obj)
+                for segment in new_segments:
+                    key = segment_key(segment, playlist_url)
+                    if key is not None and (not key.supported or not decryption_available()):
+                        logging.error(f"Расшифровка сегментов трансляции недоступна: {key.method}")
+                        return self._fail('format')
+                    window.append(urljoin(playlist_url, segment.uri))
+                    keys.append(key)
+                if new_segments:
+                    last_new = poll_started
+                
+                if len(window) > merger.merged:
+                    merger.total_segments = len(window)
+                    # Мимо кэша: перезапущенная трансляция может повторить имена
+                    # сегментов с другим содержимым
+                    if not self._download_segments_to_memory(window, merger, merger.merged,
+                                                             progress_callback, keys,
+                                                             use_cache=False):
+                        if not self.download_manager.is_stopped:
+                            return False
+                    window.trim(merger.merged)
+                    keys.trim(merger.merged)
+                
+                now = time.monotonic()
+                if self.download_manager.is_stopped:
+                    logging.info("Запись трансляции остановлена")
+                    break
+                if playlist.ended:
+                    logging.info("Трансляция завершена")
+                    break
+                if self.config.live_duration and now - started >= self.config.live_duration:
+                    logging.info("Достигнут предел длительности записи трансляции")
+                    break
+                if now - last_new >= self.config.live_idle_timeout:
+                    logging.warning(f"Новых сегментов нет {self.config.live_idle_timeout:.0f} с, "
+                                    f"запись трансляции завершена")
+                    break
+                
+                delay = playlist.poll_interval(bool(new_segments)) - (now - poll_started)
+                if not self.download_manager.sleep(max(0.0, delay)):
+                    break
+                m3u8_obj = self._reload_playlist(playlist_url)
+                if m3u8_obj is None:
+                    if self.download_manager.is_stopped:
+                        break
+                    return False
+            
+            merger.total_segments = merger.merged
+            if merger.merged == 0:
+                logging.error("Не записано ни одного сегмента трансляции")
+                return self._fail('playlist')
+            if playlist.skipped:
+                logging.warning(f"Всего пропущено сегментов трансляции: {playlist.skipped}")
+            # Остановка здесь - штатный конец записи, поэтому склейку она не прерывает
+            with self.metrics.merge_seconds.time(mode=merger.mode):
+                success = merger.finish()
+            return success or self._fail('merge')
+        finally:
+            if not success:
+                merger.abort()
+    
+    def _reload_playlist(self, playlist_url: str):
+        """Повторная загрузка плейлиста трансляции с повторами временных ошибок"""
+        import m3u8
+        import requests
+        
+        for attempt in range(self.config.max_retries):
+            try:
+                with self._request(playlist_url, self.config.timeout) as response:
+                    response.raise_for_status()
+                    return m3u8.loads(response.text)
+            except requests.exceptions.RequestException as e:
+                if self.download_manager.is_stopped:
+                    return None
+                if not self.retry_policy.is_retryable(e) or attempt + 1 >= self.config.max_retries:
+                    logging.error(f"Не удалось обновить плейлист {playlist_url}: {e}")
+                    self._fail('network')
+                    return None
+                self.retries += 1
+                self.metrics.retries.inc(cause=self.retry_policy.cause(e))
+                logging.warning(f"Ошибка обновления плейлиста: {e}. "
+                              f"Попытка {attempt + 1}/{self.config.max_retries}")
+                if not self.download_manager.sleep(self.retry_policy.delay(attempt, e)):
+                    return None
+        return None
+    
+    def _download_segments_to_memory(self, segment_urls: list, merger: StreamingMerger,
+                                     start_index: int,
+                                     progress_callback: Optional[Callable] = None,
+                                     keys: Optional[list] = None,
+                                     use_cache: bool = True) -> bool:
+        """Загрузка сегментов через буфер в памяти прямо в StreamingMerger
+        
+        Отдельный поток записи забирает сегменты по порядку и передает их
+        в склейку; загрузчики ждут, пока буфер не освободит место.
+        """
+        buffer = ReorderBuffer(self.config.memory_budget, start_index)
+        writer_error = []
+        
+        def writer():
+            try:
+                while merger.merged < len(segment_urls):
+                    data = buffer.get()
+                    if data is None:
+                        return
+                    merger.write(data)
+            except Exception as e:
+                writer_error.append(e)
+                buffer.close()
+        
+        writer_thread = threading.Thread(target=writer, name='segment-writer', daemon=True)
+        writer_thread.start()
+        
+        success = False
+        try:
+            # Остановка будит загрузчиков, ждущих места в буфере
+            with self.download_manager.track(buffer.close):
+                success = self._download_segments(segment_urls, None, progress_callback,
+                                                  start_index=start_index, buffer=buffer, keys=keys,
+                                                  use_cache=use_cache)
+        finally:
+            if not success:
+                buffer.close()
+            writer_thread.join()
+        
+        if writer_error:
+            raise writer_error[0]
+        return success
+    
+    def _download_segments(self, segment_urls: list, segments_dir: Optional[Path],
+                           progress_callback: Optional[Callable] = None,
+                           on_segment: Optional[Callable] = None,
+                           start_index: int = 0,
+                           buffer: Optional[ReorderBuffer] = None,
+                           keys: Optional[list] = None,
+                           use_cache: bool = True) -> bool:
+        """Параллельная загрузка сегментов ограниченным пулом потоков
+        
+        Имена файлов сегментов задаются по индексу в плейлисте, поэтому порядок
+        завершения загрузок не влияет на порядок склейки в _merge_segments.
+        on_segment вызывается с индексом каждого загруженного сегмента;
+        сегменты до start_index считаются уже обработанными.
+        Если передан buffer, сегменты кладутся в него вместо файлов,
+        иначе уже загруженные файлы проверяются по манифесту сегментов.
+        keys - ключи расшифровки сегментов (None для открытых);
+        use_cache=False загружает сегменты мимо кэша.
+        
+        Число запросов в полете задает self.concurrency (не больше max_workers);
+        progress_callback получает третьим аргументом его показатели.
+        
+        При загрузке в файлы сегмент с временной ошибкой возвращается
+        в очередь с задержкой и не занимает поток, а остальные сегменты
+        продолжают загружаться. В буфер сегменты повторяются в своем потоке:
+        буфер ждет их строго по порядку, поэтому окончательная ошибка
+        сегмента сразу завершает загрузку, а событие abort обрывает повторы
+        и задержки перед ними в остальных потоках.
+        """
+        total_segments = len(segment_urls)
+        max_workers = max(1, self.config.max_workers)
+        completed = start_index
+        pending = {}
+        next_index = start_index
+        attempts = {}
+        retries = []
+        failed = []
+        queue_depth = 0  # Вклад этой загрузки в общий индикатор очереди
+        finished = False
+        abort = threading.Event() if buffer is not None else None
+        
+        manifest = None
+        verified = set()
+        if buffer is None:
+            manifest = SegmentManifest(segments_dir.parent / 'manifest.json')
+            verified = manifest.verify(segments_dir, segment_urls, self.config.verify_checksums)
+            if verified:
+                logging.info(f"Проверено по манифесту: {len(verified)} сегментов уже загружено")
+        
+        def segment_done(index: int):
+            nonlocal completed
+            if on_segment:
+                on_segment(index)
+            completed += 1
+            # Обновляем прогресс
+            if progress_callback:
+                progress_callback(completed, total_segments, self.concurrency.snapshot())
+        
+        def submit(index: int):
+            key = keys[index] if keys is not None else None
+            if buffer is not None:
+                future = executor.submit(
+                    self._fetch_to_buffer, segment_urls[index],
+                    index, total_segments, buffer, None, key, use_cache, abort
+                )
+            else:
+                segment_file = segments_dir / f"segment_{index:04d}.ts"
+                future = executor.submit(
+                    self.download_segment, segment_urls[index],
+                    segment_file, index, total_segments, manifest,
+                    attempts.get(index, 0), key, use_cache
+                )
+            pending[future] = index
+        
+        # Остановка отменяет этот future и будит ожидание загрузок ниже
+        stop_signal = Future()
+        
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='segment')
+        with executor, self.download_manager.track(stop_signal.cancel):
+            try:
+                while next_index < total_segments or pending or retries:
+                    if self.download_manager.is_stopped:
+                        return False
+                    
+                    # Сначала повторы, у которых истекла задержка
+                    now = time.monotonic()
+                    while retries and retries[0][0] <= now and len(pending) < self.concurrency.limit:
+                        submit(heapq.heappop(retries)[1])
+                    
+                    # В полете не больше запросов, чем разрешает регулятор;
+                    # очередь не растет, и остановка не ждет разбора всего плейлиста
+                    while next_index < total_segments and len(pending) < self.concurrency.limit:
+                        if next_index not in verified:
+                            submit(next_index)
+                        else:
+                            segment_done(next_index)
+                        next_index += 1
+                    
+                    waiting = total_segments - next_index + len(retries)
+                    self.metrics.queue_depth.inc(waiting - queue_depth)
+                    queue_depth = waiting
+                    
+                    timeout = max(0.0, retries[0][0] - now) if retries else None
+                    if not pending:
+                        if timeout is not None and not self.download_manager.sleep(timeout):
+                            return False
+                        continue
+                    
+                    done, _ = wait([stop_signal, *pending], timeout=timeout, return_when=FIRST_COMPLETED)
+                    done.discard(stop_signal)
+                    for future in done:
+                        index = pending.pop(future)
+                        try:
+                            result = future.result()
+                        except RetryLater as e:
+                            attempts[index] = attempts.get(index, 0) + 1
+                            heapq.heappush(retries, (time.monotonic() + e.delay, index))
+                            continue
+                        if result:
+                            segment_done(index)
+                        elif self.download_manager.is_stopped or self.failure != 'network':
+                            return False
+                        elif buffer is not None:
+                            # Буфер отдает сегменты строго по порядку: без этого
+                            # сегмента запись не продвинется, ждать остальные незачем
+                            logging.error(f"Не удалось загрузить сегмент {index + 1}")
+                            return self._fail('network')
+                        else:
+                            failed.append(index)
+                
+                if failed:
+                    failed.sort()
+                    logging.error(f"Не удалось загрузить сегменты: "
+                                  f"{', '.join(str(i + 1) for i in failed)}")
+                    return self._fail('network')
+                finished = not self.download_manager.is_stopped
+                return finished
+            finally:
+                self.metrics.queue_depth.dec(queue_depth)
+                for future in pending:
+                    future.cancel()
+                if buffer is not None and not finished:
+                    # Загрузчики могут ждать места в буфере или повтора, а выход
+                    # из пула ждет их; закрытый буфер и abort отпускают их сразу
+                    abort.set()
+                    buffer.close()
+                if manifest is not None:
+                    manifest.save()
+    
+    def download_mp4_video(self, video_url: str, output_dir: Path, 
+                          progress_callback: Optional[Callable] = None) -> bool:
+        """Загрузка MP4 видео"""
+        self.failure = ''
+        try:
+            video_id = self._extract_video_id(video_url)
+            video_dir = output_dir / video_id
+            video_dir.mkdir(parents=True, exist_ok=True)
+            
+            with JobLock(video_dir) as locked:
+                if not locked:
+                    return self._busy(video_dir)
+                video_path = video_dir / 'output.mp4'
+                
+                remote = self._probe_ranges(video_url)
+                if remote is not None:
+                    connections = self.config.mp4_connections
+                    if remote.size < self.config.range_min_size:
+                        connections = 1
+                    success = self._download_ranged(video_url, video_path, remote,
+                                                    connections, progress_callback)
+                else:
+                    success = self._download_single_stream(video_url, video_path, progress_callback)
+                
+                if success:
+                    logging.info(f"MP4 видео успешно загружено: {video_path}")
+                return success
+            
+        except Exception as e:
+            if self.download_manager.is_stopped:
+                # Остановка обрывает запросы в полете; это не ошибка загрузки
+                return self._fail('stopped')
+            logging.error(f"Ошибка при загрузке MP4 видео: {e}")
+            return self._fail('error', e)
+    
+    def _probe_ranges(self, url: str) -> Optional[ResumeJournal]:
+        """Проверка поддержки Range-запросов
+        
+        Возвращает пустой журнал с размером и валидаторами файла
+        или None, если сервер не отдает диапазоны: игнорирует Range (200 без
+        Content-Range) или отвергает его (416). Окончательная ошибка HTTP
+        (404 и т.п.) выбрасывается: полный GET получил бы ту же.
+        """
+        import requests
+        try:
+            with self._request(url, self.config.timeout, stream=True,
+                               headers={'Range': 'bytes=0-0'}) as response:
+                if response.status_code == 416:
+                    return None
+                response.raise_for_status()
+                content_range = response.headers.get('content-range', '')
+                if response.status_code == 206 and '/' in content_range:
+                    total = content_range.rsplit('/', 1)[1]
+                    if total.isdigit() and int(total) > 0:
+                        return ResumeJournal(
+                            url=url,
+                            size=int(total),
+                            etag=response.headers.get('etag', ''),
+                            last_modified=response.headers.get('last-modified', '')
+                        )
+                return None
+        except requests.exceptions.RequestException as e:
+            if self.download_manager.is_stopped:
+                return None
+            if not self.retry_policy.is_retryable(e):
+                raise
+            logging.warning(f"Не удалось проверить поддержку Range для {url}: {e}")
+            return None
+    
+    def _download_single_stream(self, video_url: str, video_path: Path,
+                                progress_callback: Optional[Callable] = None) -> bool:
+        """Загрузка файла одним потоком (без докачки)"""
+        part_path = video_path.with_name(video_path.name + '.part')
+        downloaded_size = 0
+        request = self._request(video_url, self.config.timeout, stream=True)
+        try:
+            with self.metrics.active_connections.track(), request as response:
+                response.raise_for_status()
+                total_size = int(response.headers.get('content-length', 0))
+                
+                with open(part_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=self.config.chunk_size):
+                        if self.download_manager.is_stopped:
+                            return False
+                            
+                        self.download_manager.wait_if_paused()
+                        
+                        if chunk:
+                            if not self._throttle(len(chunk)):
+                                return False
+                            f.write(chunk)
+                            downloaded_size += len(chunk)
+                            
+                            if progress_callback and total_size > 0:
+                                progress_callback(downloaded_size, total_size)
+        finally:
+            self.bandwidth.release(self.download_manager.sleep)
+            self.metrics.download_bytes.inc(downloaded_size)
+        
+        part_path.replace(video_path)
+        return True
+    
+    def _open_journal(self, part_path: Path, journal_path: Path,
+                      remote: ResumeJournal, connections: int) -> ResumeJournal:
+        """Загрузка журнала докачки или создание нового с разбиением на диапазоны"""
+        journal = ResumeJournal.load(journal_path)
+        if journal is not None and part_path.exists():
+            if journal.matches(remote) and part_path.stat().st_size == remote.size:
+                done = sum(position - start for start, _, position in journal.ranges)
+                logging.info(f"Докачка {part_path.name}: уже загружено {done} из {remote.size} байт")
+                return journal
+            logging.info(f"Файл на сервере изменился, частичная загрузка {part_path.name} удалена")
+        
+        total_size = remote.size
+        range_size = -(-total_size // max(1, connections))
+        remote.ranges = [[start, min(start + range_size, total_size) - 1, start]
+                         for start in range(0, total_size, range_size)]
+        
+        with open(part_path, 'wb') as f:
+            f.truncate(total_size)
+        remote.save(journal_path)
+        return remote
+    
+    def _download_ranged(self, video_url: str, video_path: Path, remote: ResumeJournal,
+                         connections: int, progress_callback: Optional[Callable] = None) -> bool:
+        """Загрузка файла по диапазонам байт с докачкой
+        
+        Файл заранее выделяется под полный размер, каждый диапазон пишется
+        со своего смещения через отдельный дескриптор. До завершения данные
+        лежат в output.mp4.part, а прогресс диапазонов - в журнале рядом с ним.
+        """
+        part_path = video_path.with_name(video_path.name + '.part')
+        journal_path = part_path.with_name(part_path.name + '.json')
+        journal = self._open_journal(part_path, journal_path, remote, connections)
+        total_size = journal.size
+        
+        journal_lock = threading.Lock()
+        downloaded = [sum(position - start for start, _, position in journal.ranges)]
+        last_save = [time.monotonic()]
+        
+        def on_chunk(size: int):
+            with journal_lock:
+                downloaded[0] += size
+                # Сохраняем прогресс не чаще раза в секунду
+                if time.monotonic() - last_save[0] >= 1.0:
+                    journal.save(journal_path)
+                    last_save[0] = time.monotonic()
+                # Под замком, чтобы счетчик не приходил из потоков в обратном порядке:
+                # уменьшение ProgressTracker считает началом новой загрузки
+                if progress_callback:
+                    progress_callback(downloaded[0], total_size)
+        
+        pending = [state for state in journal.ranges if state[2] <= state[1]]
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, len(pending)),
+                                    thread_name_prefix='range') as executor:
+                futures = [executor.submit(self._download_range, video_url, part_path,
+                                           state, journal.if_range, on_chunk)
+                           for state in pending]
+                results = [future.result() for future in futures]
+        finally:
+            with journal_lock:
+                journal.save(journal_path)
+        
+        if not all(results):
+            return False
+        
+        part_path.replace(video_path)
+        journal_path.unlink(missing_ok=True)
+        return True
+    
+    def _download_range(self, url: str, part_path: Path, state: list, if_range: str,
+                        on_chunk: Callable) -> bool:
+        """Загрузка одного диапазона байт с повторными попытками
+        
+        state - изменяемая запись журнала [начало, конец, позиция]; при обрыве
+        соединения докачивается только оставшаяся часть диапазона.
+        """
+        import requests
+        start, end = state[0], state[1]
+        for attempt in range(self.config.max_retries):
+            position = state[2]
+            try:
+                self.download_manager.wait_if_paused()
+                if self.download_manager.is_stopped:
+                    return False
+                
+                headers = {'Range': f'bytes={state[2]}-{end}'}
+                if if_range:
+                    headers['If-Range'] = if_range
+                with self.metrics.active_connections.track():
+                    request = self._request(url, self.config.timeout, stream=True, headers=headers)
+                    with request as response, open(part_path, 'r+b', buffering=0) as f:
+                        response.raise_for_status()
+                        if response.status_code != 206:
+                            # С If-Range сервер отдает весь файл, если тот изменился
+                            logging.error(f"Сервер не вернул диапазон {start}-{end} для {url}")
+                            return self._fail('network')
+                        
+                        f.seek(state[2])
+                        for chunk in response.iter_content(chunk_size=self.config.chunk_size):
+                            if self.download_manager.is_stopped:
+                                return False
+                            
+                            self.download_manager.wait_if_paused()
+                            
+                            if chunk:
+                                chunk = chunk[:end + 1 - state[2]]
+                                if not self._throttle(len(chunk)):
+                                    return False
+                                f.write(chunk)
+                                state[2] += len(chunk)
+                                on_chunk(len(chunk))
+                
+                if state[2] > end:
+                    return True
+                raise requests.exceptions.ChunkedEncodingError(
+                    f"Диапазон {start}-{end} получен не полностью"
+                )
+                
+            except requests.exceptions.RequestException as e:
+                if self.download_manager.is_stopped:
+                    return False
+                if not self.retry_policy.is_retryable(e):
+                    logging.error(f"Ошибка загрузки диапазона {start}-{end}: {e}")
+                    return self._fail('network')
+                self.retries += 1
+                self.metrics.retries.inc(cause=self.retry_policy.cause(e))
+                logging.warning(f"Ошибка загрузки диапазона {start}-{end}: {e}. "
+                              f"Попытка {attempt + 1}/{self.config.max_retries}")
+                if attempt < self.config.max_retries - 1:
+                    if not self.download_manager.sleep(self.retry_policy.delay(attempt, e)):
+                        return False
+            finally:
+                self.bandwidth.release(self.download_manager.sleep)
+                self.metrics.download_bytes.inc(state[2] - position)
+        
+        logging.error(f"Не удалось загрузить диапазон {start}-{end} после {self.config.max_retries} попыток")
+        return self._fail('network')
+    
+    def _extract_video_id(self, url: str) -> str:
+        """Имя папки видео: читаемая часть URL и хэш канонического URL (см. layout.py)"""
+        return video_id(url)
+    
+    def _busy(self, video_dir: Path) -> bool:
+        logging.error(f"Папка {video_dir} занята другой загрузкой того же видео")
+        return self._fail('busy')
+    
+    def _merge_segments(self, video_dir: Path, segments_dir: Path, 
+                       total_segments: int) -> bool:
+        """Объединение сегментов в единый файл"""
+        try:
+            output_path = video_dir / 'output.mp4'
+            
+            if output_path.exists():
+                logging.info(f"Выходной файл уже существует: {output_path}")
+                return True
+            
+            # Создаем список файлов для FFmpeg
+            filelist_path = video_dir / 'filelist.txt'
+            with open(filelist_path, 'w', encoding='utf-8') as f:
+                for i in range(total_segments):
+                    segment_path = segments_dir / f'segment_{i:04d}.ts'
+                    if segment_path.exists():
+                        f.write(f"file '{segment_path.absolute()}'\n")
+                    else:
+                        logging.warning(f"Сегмент отсутствует: {segment_path}")
+            
+            # Запускаем FFmpeg; прерванная склейка не должна выглядеть готовым файлом
+            part_path = output_path.with_name(output_path.name + '.part')
+            ffmpeg_cmd = [
+                '-f', 'concat', '-safe', '0', 
+                '-i', str(filelist_path), '-c', 'copy', '-f', 'mp4', str(part_path),
+                '-y'  # Перезаписывать существующий файл
+            ]
+            
+            result = self._run_ffmpeg(ffmpeg_cmd)
+            if result is None:
+                logging.error("Таймаут при объединении сегментов")
+                part_path.unlink(missing_ok=True)
+                return False
+            
+            if result[0] == 0:
+                part_path.replace(output_path)
+                logging.info(f"Видео успешно объединено: {output_path}")
+                # Удаляем временные файлы
+                filelist_path.unlink(missing_ok=True)
+                return True
+            else:
+                if not self.download_manager.is_stopped:
+                    logging.error(f"Ошибка FFmpeg: {result[1]}")
+                part_path.unlink(missing_ok=True)
+                return False
+                
+        except Exception as e:
+            logging.error(f"Ошибка при объединении сегментов: {e}")
+            return False
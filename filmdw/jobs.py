@@ -0,0 +1,292 @@
+"""Постоянная очередь загрузок и планировщик заданий"""
+import logging
+import threading
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Optional, Callable
+from urllib.parse import urlparse
+
+from .cache import SegmentCache
+from .config import DownloadConfig
+from .downloader import VideoDownloader
+from .metrics import DownloadMetrics, start_metrics_server
+from .ratelimit import TokenBucket
+from .retry import CircuitBreakers
+from .transport import connections_per_download, create_transport
+
+
+@dataclass
+class DownloadJob:
+    """Задание очереди загрузок"""
+    id: int
+    url: str
+    output_dir: str
+    priority: int = 0
+    status: str = 'queued'  # queued, running, done, failed, stopped
+    attempts: int = 0
+    error: str = ''  # Класс ошибки VideoDownloader.failure
+    
+    @property
+    def host(self) -> str:
+        return urlparse(self.url).netloc
+
+
+class JobStore:
+    """Постоянное хранилище заданий в SQLite
+    
+    Задания переживают перезапуск: незавершенные при аварии задания
+    (status = 'running') при открытии снова ставятся в очередь.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        import sqlite3
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' url TEXT NOT NULL,'
+            ' output_dir TEXT NOT NULL,'
+            ' priority INTEGER NOT NULL DEFAULT 0,'
+            " status TEXT NOT NULL DEFAULT 'queued',"
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            " error TEXT NOT NULL DEFAULT '',"
+            ' created REAL NOT NULL)'
+        )
+        self._conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+        self._conn.commit()
+    
+    def _rows(self, query: str, params: tuple = ()) -> list:
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [DownloadJob(*row) for row in rows]
+    
+    def add(self, url: str, output_dir: Path, priority: int = 0) -> DownloadJob:
+        """Добавить задание; чем больше priority, тем раньше оно запустится"""
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT INTO jobs (url, output_dir, priority, created) VALUES (?, ?, ?, ?)',
+                (url, str(output_dir), priority, time.time())
+            )
+            self._conn.commit()
+            job_id = cursor.lastrowid
+        return DownloadJob(job_id, url, str(output_dir), priority)
+    
+    def queued(self) -> list:
+        """Задания в очереди в порядке приоритета и времени добавления"""
+        return self._rows(
+            'SELECT id, url, output_dir, priority, status, attempts, error FROM jobs'
+            " WHERE status = 'queued' ORDER BY priority DESC, id"
+        )
+    
+    def get(self, job_id: int) -> Optional[DownloadJob]:
+        jobs = self._rows('SELECT id, url, output_dir, priority, status, attempts, error FROM jobs'
+                          ' WHERE id = ?', (job_id,))
+        return jobs[0] if jobs else None
+    
+    def all(self) -> list:
+        return self._rows('SELECT id, url, output_dir, priority, status, attempts, error FROM jobs ORDER BY id')
+    
+    def update(self, job: DownloadJob):
+        with self._lock:
+            self._conn.execute(
+                'UPDATE jobs SET status = ?, attempts = ?, error = ? WHERE id = ?',
+                (job.status, job.attempts, job.error, job.id)
+            )
+            self._conn.commit()
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobScheduler:
+    """Планировщик очереди загрузок с глобальным и похостовым ограничением
+    
+    Каждое задание выполняется своим VideoDownloader (со своим DownloadManager
+    для паузы и остановки), но все они используют общий пул соединений,
+    выключатели хостов, кэш сегментов и метрики, а скорость всех заданий
+    ограничена общей корзиной.
+    """
+    
+    def __init__(self, config: DownloadConfig, store: JobStore,
+                 progress_callback: Optional[Callable] = None,
+                 finished_callback: Optional[Callable] = None):
+        self.config = config
+        self.store = store
+        self.progress_callback = progress_callback
+        self.finished_callback = finished_callback
+        # Пул общий для всех заданий, и каждому нужно столько же соединений,
+        # сколько одиночной загрузке
+        pool_size = config.pool_size or config.max_jobs * connections_per_download(config)
+        self.transport = create_transport(replace(config, pool_size=pool_size))
+        self.circuit_breakers = CircuitBreakers(config)
+        self.bandwidth = TokenBucket(config.rate_limit)
+        self.segment_cache = (SegmentCache(Path(config.cache_dir), config.cache_size)
+                              if config.cache_dir else None)
+        self.metrics = DownloadMetrics()
+        self._metrics_server = None
+        self.running = {}  # id задания -> VideoDownloader
+        self._cancelled = set()  # id заданий, остановленных по отдельности
+        self._hosts = {}
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+    
+    def add(self, url: str, output_dir: Path, priority: int = 0) -> DownloadJob:
+        """Добавить задание в очередь и разбудить планировщик"""
+        job = self.store.add(url, output_dir, priority)
+        with self._condition:
+            self._condition.notify_all()
+        return job
+    
+    def start(self):
+        if self.config.metrics_port:
+            self._metrics_server = start_metrics_server(self.metrics, self.config.metrics_port)
+        self._thread = threading.Thread(target=self._run, name='job-scheduler', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Остановить планировщик и все выполняющиеся задания"""
+        with self._condition:
+            self._stopped = True
+            for downloader in self.running.values():
+                downloader.download_manager.stop()
+            self._condition.notify_all()
+    
+    def pause(self, job_id: int):
+        """Приостановить выполняющееся задание (слот задания остается занятым)"""
+        downloader = self.running.get(job_id)
+        if downloader is not None:
+            downloader.download_manager.pause()
+    
+    def resume(self, job_id: int):
+        downloader = self.running.get(job_id)
+        if downloader is not None:
+            downloader.download_manager.resume()
+    
+    def cancel(self, job_id: int):
+        """Остановить одно задание; в отличие от stop, оно не вернется в очередь"""
+        with self._condition:
+            downloader = self.running.get(job_id)
+            if downloader is not None:
+                self._cancelled.add(job_id)
+                downloader.download_manager.stop()
+                return
+            job = self.store.get(job_id)
+            if job is not None and job.status == 'queued':
+                job.status = 'stopped'
+                job.error = 'stopped'
+                self.store.update(job)
+                if self.finished_callback:
+                    self.finished_callback(job)
+    
+    def set_rate_limit(self, rate: int, job_rate: Optional[int] = None):
+        """Изменить на лету общий предел скорости и, если задан, предел каждого задания"""
+        self.bandwidth.set_rate(rate)
+        if job_rate is not None:
+            self.config.job_rate_limit = job_rate
+            with self._condition:
+                for downloader in self.running.values():
+                    downloader.set_rate_limit(job_rate)
+    
+    def wait(self):
+        """Дождаться, пока очередь опустеет и все задания завершатся"""
+        with self._condition:
+            while not self._stopped and (self.running or self.store.queued()):
+                self._condition.wait()
+    
+    def close(self):
+        """Остановить задания и закрыть общие ресурсы
+        
+        Остановленные задания еще записывают итог в хранилище и закрывают
+        соединения, поэтому транспорт и кэш закрываются только после них.
+        """
+        self.stop()
+        if self._thread is not None:
+            self._thread.join()
+        with self._condition:
+            while self.running:
+                self._condition.wait()
+        self.transport.close()
+        if self.segment_cache is not None:
+            self.segment_cache.close()
+        if self._metrics_server is not None:
+            self._metrics_server.shutdown()
+    
+    def _run(self):
+        with self._condition:
+            while not self._stopped:
+                for job in self._ready_jobs():
+                    self._launch(job)
+                self._condition.wait()
+    
+    def _ready_jobs(self) -> list:
+        """Задания, которые можно запустить с учетом ограничений"""
+        ready = []
+        slots = self.config.max_jobs - len(self.running)
+        hosts = dict(self._hosts)
+        for job in self.store.queued():
+            if slots <= 0:
+                break
+            if hosts.get(job.host, 0) >= self.config.max_jobs_per_host:
+                continue
+            hosts[job.host] = hosts.get(job.host, 0) + 1
+            slots -= 1
+            ready.append(job)
+        return ready
+    
+    def _launch(self, job: DownloadJob):
+        job.status = 'running'
+        job.attempts += 1
+        self.store.update(job)
+        
+        downloader = VideoDownloader(self.config, transport=self.transport,
+                                     circuit_breakers=self.circuit_breakers,
+                                     bandwidth=self.bandwidth,
+                                     segment_cache=self.segment_cache,
+                                     metrics=self.metrics)
+        self.running[job.id] = downloader
+        self._hosts[job.host] = self._hosts.get(job.host, 0) + 1
+        threading.Thread(target=self._run_job, args=(job, downloader),
+                         name=f'job-{job.id}', daemon=True).start()
+    
+    def _run_job(self, job: DownloadJob, downloader: VideoDownloader):
+        logging.info(f"Задание {job.id}: начата загрузка {job.url}")
+        
+        def on_progress(current: int, total: int, stats: Optional[dict] = None):
+            if self.progress_callback:
+                self.progress_callback(job, current, total, stats)
+        
+        try:
+            success = downloader.download(job.url, Path(job.output_dir), on_progress)
+            job.error = '' if success else downloader.failure
+        except Exception as e:
+            logging.error(f"Задание {job.id}: {e}")
+            success = False
+            job.error = 'error'
+        
+        if success:
+            job.status = 'done'
+        elif downloader.download_manager.is_stopped:
+            with self._condition:
+                cancelled = job.id in self._cancelled
+                self._cancelled.discard(job.id)
+            # Остановленное вместе с планировщиком задание вернется в очередь
+            # при следующем запуске
+            job.status = 'stopped' if cancelled else 'queued'
+            if not cancelled:
+                job.error = ''
+        else:
+            job.status = 'failed'
+        self.store.update(job)
+        logging.info(f"Задание {job.id}: {job.status}")
+        if self.finished_callback:
+            self.finished_callback(job)
+        
+        with self._condition:
+            del self.running[job.id]
+            self._hosts[job.host] -= 1
+            self._condition.notify_all()
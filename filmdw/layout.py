@@ -0,0 +1,109 @@
+"""Имена папок загрузок и межпроцессная блокировка папки видео"""
+import hashlib
+import os
+import re
+from pathlib import Path
+from urllib.parse import urlparse
+
+from .cache import normalize_url
+
+SLUG_LENGTH = 48
+
+
+def video_id(url: str) -> str:
+    """Имя папки видео: читаемая часть из пути URL и хэш канонического URL
+    
+    Хэш берется от нормализованного URL (без параметров подписи CDN), поэтому
+    повторная загрузка того же видео попадает в ту же папку и докачивается,
+    а разные плейлисты с одинаковыми именами каталогов не пересекаются.
+    """
+    path_parts = [part for part in urlparse(url).path.split('/') if part]
+    if len(path_parts) >= 3:
+        slug = path_parts[-3]
+    elif path_parts:
+        slug = path_parts[-1].split('.')[0]
+    else:
+        slug = ''
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '_', slug).strip('_')[:SLUG_LENGTH] or 'video'
+    digest = hashlib.blake2b(normalize_url(url).encode('utf-8'), digest_size=6).hexdigest()
+    return f'{slug}-{digest}'
+
+
+class JobLock:
+    """Исключительная блокировка папки видео (файл .lock)
+    
+    Блокировку держит открытый файл (flock, в Windows - msvcrt.locking),
+    поэтому ОС снимает ее при завершении процесса и после аварии не остается
+    зависших замков. Захват неблокирующий: вторая загрузка той же папки
+    сразу получает отказ. В файл пишется PID владельца для диагностики.
+    """
+    
+    def __init__(self, video_dir: Path):
+        self.path = video_dir / '.lock'
+        self._file = None
+    
+    def acquire(self) -> bool:
+        while True:
+            lock_file = open(self.path, 'a+')
+            try:
+                _lock(lock_file)
+            except OSError:
+                lock_file.close()
+                return False
+            # Пока мы ждали, прежний владелец мог удалить файл: тогда
+            # наш замок стоит на уже несуществующем файле
+            try:
+                if os.fstat(lock_file.fileno()).st_ino == os.stat(self.path).st_ino:
+                    break
+            except OSError:
+                pass
+            _unlock(lock_file)
+            lock_file.close()
+        
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(f'{os.getpid()}\n')
+        lock_file.flush()
+        self._file = lock_file
+        return True
+    
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            self.path.unlink()
+        except OSError:
+            # В Windows открытый файл удалить нельзя - он останется до следующей загрузки
+            pass
+        _unlock(self._file)
+        self._file.close()
+        self._file = None
+    
+    def __enter__(self) -> bool:
+        return self.acquire()
+    
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+if os.name == 'nt':
+    import msvcrt
+    
+    def _lock(lock_file):
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    
+    def _unlock(lock_file):
+        try:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        except OSError:
+            pass
+else:
+    import fcntl
+    
+    def _lock(lock_file):
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    
+    def _unlock(lock_file):
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,80 @@
+"""Захват трансляций: плейлисты HLS без EXT-X-ENDLIST"""
+import logging
+from collections import deque
+
+
+class LiveWindow:
+    """Растущий список (URL или ключей) сегментов, который хранит только несклеенный хвост
+    
+    Индексы сквозные с начала захвата, как у обычного списка; trim
+    отбрасывает уже склеенные сегменты, поэтому память не растет
+    при многочасовой записи.
+    """
+    
+    def __init__(self, start_index: int = 0):
+        self.base = start_index
+        self._items = deque()
+    
+    def __len__(self) -> int:
+        return self.base + len(self._items)
+    
+    def __getitem__(self, index: int):
+        if index < self.base:
+            raise IndexError(f"сегмент {index} уже отброшен")
+        return self._items[index - self.base]
+    
+    def append(self, item):
+        self._items.append(item)
+    
+    def trim(self, index: int):
+        """Отбросить сегменты с индексом меньше index"""
+        while self._items and self.base < index:
+            self._items.popleft()
+            self.base += 1
+
+
+class LivePlaylist:
+    """Отслеживание медиаплейлиста трансляции между перезагрузками
+    
+    Сегменты различаются по номеру EXT-X-MEDIA-SEQUENCE, поэтому повторно
+    пришедшие сегменты пропускаются, а выпавшие из окна плейлиста, пока
+    загрузка отставала, отмечаются в журнале как пропущенные.
+    """
+    
+    def __init__(self):
+        self.next_sequence = None
+        self.target_duration = 0.0
+        self.ended = False
+        self.skipped = 0
+    
+    def update(self, playlist) -> list:
+        """Разобрать очередную версию плейлиста; возвращает новые сегменты"""
+        self.target_duration = float(playlist.target_duration or self.target_duration or 6)
+        self.ended = playlist.is_endlist
+        first = playlist.media_sequence or 0
+        last = first + len(playlist.segments)
+        
+        if self.next_sequence is None:
+            self.next_sequence = first
+        elif last < self.next_sequence - len(playlist.segments):
+            # Номера откатились назад - сервер перезапустил трансляцию
+            logging.warning(f"Нумерация сегментов трансляции сброшена: {self.next_sequence} -> {first}")
+            self.next_sequence = first
+        elif first > self.next_sequence:
+            missed = first - self.next_sequence
+            self.skipped += missed
+            logging.warning(f"Пропущено {missed} сегментов трансляции: они ушли из плейлиста "
+                            f"раньше, чем были загружены")
+            self.next_sequence = first
+        
+        new_segments = playlist.segments[max(0, self.next_sequence - first):]
+        self.next_sequence = max(self.next_sequence, last)
+        return list(new_segments)
+    
+    def poll_interval(self, changed: bool) -> float:
+        """Пауза до следующей перезагрузки (RFC 8216, 6.3.4)
+        
+        Если плейлист изменился - целевая длительность сегмента,
+        иначе половина ее.
+        """
+        return self.target_duration if changed else self.target_duration / 2
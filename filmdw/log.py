@@ -0,0 +1,125 @@
+"""Асинхронный журнал: очередь, JSON-записи, ротация и прореживание частых событий
+
+Потоки загрузки только кладут запись в очередь (QueueHandler); запись
+на диск и в консоль выполняет отдельный поток QueueListener. Частые
+события по сегментам, отмеченные extra={'sample': ...}, прореживаются
+еще до очереди.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from typing import Optional
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Стандартные поля LogRecord: все остальные пришли через extra и попадают в JSON
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись журнала одной строкой JSON"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_FIELDS:
+                entry[name] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """Прореживание событий с атрибутом sample
+    
+    Из каждой группы (значение sample) за interval секунд проходят
+    первые burst записей, остальные отбрасываются. Число отброшенных
+    дописывается к следующей прошедшей записи группы (поле suppressed),
+    так что в журнале остается сводка, а не поток строк на каждый сегмент.
+    Записи без sample проходят всегда.
+    """
+    
+    def __init__(self, burst: int = 5, interval: float = 1.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._groups = {}  # sample -> [начало окна, прошло записей, отброшено]
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        group = getattr(record, 'sample', None)
+        if group is None:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            state = self._groups.get(group)
+            if state is None or now - state[0] >= self.interval:
+                suppressed = state[2] if state is not None else 0
+                self._groups[group] = [now, 1, 0]
+            elif state[1] < self.burst:
+                state[1] += 1
+                suppressed = 0
+            else:
+                state[2] += 1
+                return False
+        if suppressed:
+            record.msg = f"{record.getMessage()} (пропущено похожих записей: {suppressed})"
+            record.args = None
+            record.suppressed = suppressed
+        return True
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def stop(self):
+        # Повторная остановка (явно и из atexit) ничего не делает
+        if self._thread is not None:
+            super().stop()
+
+
+def setup_logging(level=logging.INFO, log_file: Optional[str] = None, json_format: bool = False,
+                  stream=sys.stderr, max_bytes: int = 10 * 1024 * 1024, backup_count: int = 3,
+                  sample_burst: int = 5,
+                  sample_interval: float = 1.0) -> logging.handlers.QueueListener:
+    """Настроить корневой журнал через очередь
+    
+    Файл журнала ротируется по max_bytes (хранится backup_count старых
+    файлов). Возвращает запущенный QueueListener; он останавливается
+    (с дозаписью очереди) при выходе из процесса.
+    """
+    formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+    handlers = []
+    if stream is not None:
+        handlers.append(logging.StreamHandler(stream))
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    # Очередь без предела: put никогда не ждет, даже если диск не успевает
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SampleFilter(sample_burst, sample_interval))
+    
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    
+    listener = _QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,81 @@
+"""Управление паузой и остановкой загрузки"""
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional, Callable
+
+from .config import DownloadConfig
+
+
+class DownloadManager:
+    """Менеджер загрузки с поддержкой паузы и остановки
+    
+    Пауза и остановка построены на threading.Event: приостановленные потоки
+    спят в Event.wait и не тратят процессор, а stop сразу будит их и прерывает
+    текущие HTTP-чтения, зарегистрированные через track.
+    """
+    
+    def __init__(self, config: DownloadConfig):
+        self.config = config
+        self._running = threading.Event()  # Сброшен, пока загрузка на паузе
+        self._running.set()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._active = set()  # Функции прерывания текущих чтений
+        self.download_thread: Optional[threading.Thread] = None
+        self.progress_callback: Optional[Callable] = None
+    
+    @property
+    def is_paused(self) -> bool:
+        return not self._running.is_set()
+    
+    @property
+    def is_stopped(self) -> bool:
+        return self._stopped.is_set()
+        
+    def pause(self):
+        """Приостановить загрузку"""
+        self._running.clear()
+        logging.info("Загрузка приостановлена")
+        
+    def resume(self):
+        """Возобновить загрузку"""
+        self._running.set()
+        logging.info("Загрузка возобновлена")
+        
+    def stop(self):
+        """Остановить загрузку (без блокировки GUI)"""
+        self._stopped.set()
+        self._running.set()
+        # Не блокируем главный поток ожиданием join; поток отмечаем как фоновой при создании
+        with self._lock:
+            interrupts = list(self._active)
+        for interrupt in interrupts:
+            interrupt()
+        logging.info("Загрузка остановлена")
+        
+    def wait_if_paused(self):
+        """Ожидание при паузе"""
+        if not self._running.is_set():
+            self._running.wait()
+    
+    def sleep(self, seconds: float) -> bool:
+        """Пауза между попытками, прерываемая остановкой; False, если загрузка остановлена"""
+        return not self._stopped.wait(seconds)
+    
+    @contextmanager
+    def track(self, interrupt: Callable):
+        """Зарегистрировать прерывание текущего чтения на время блока"""
+        with self._lock:
+            self._active.add(interrupt)
+        try:
+            if self.is_stopped:
+                interrupt()
+            yield
+        finally:
+            with self._lock:
+                self._active.discard(interrupt)
+            
+    def is_stopped_or_paused(self) -> bool:
+        """Проверка остановки или паузы"""
+        return self.is_stopped or self.is_paused
@@ -0,0 +1,230 @@
+"""Потоковая склейка сегментов"""
+import json
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+from typing import Optional
+
+FFMPEG_TIMEOUT = 300  # Предел одного запуска FFmpeg для склейки или сведения, с
+
+
+def _append_file(src_path: Path, dst) -> int:
+    """Дописать содержимое файла в dst без копирования через память процесса
+    
+    Для обычных файлов используется copy_file_range, для канала - sendfile;
+    если система их не поддерживает (Windows, macOS), файл копируется обычным образом.
+    dst должен быть открыт без буферизации.
+    """
+    out_fd = dst.fileno()
+    with open(src_path, 'rb') as src:
+        in_fd = src.fileno()
+        size = os.fstat(in_fd).st_size
+        offset = 0
+        
+        for method in ('copy_file_range', 'sendfile'):
+            if not hasattr(os, method):
+                continue
+            try:
+                while offset < size:
+                    if method == 'copy_file_range':
+                        copied = os.copy_file_range(in_fd, out_fd, size - offset, offset)
+                    else:
+                        copied = os.sendfile(out_fd, in_fd, offset, size - offset)
+                    if copied == 0:
+                        break
+                    offset += copied
+                if offset >= size:
+                    return size
+            except OSError:
+                # Неподдерживаемая пара дескрипторов - пробуем следующий способ
+                continue
+        
+        src.seek(offset)
+        shutil.copyfileobj(src, dst)
+    return size
+
+
+class StreamingMerger:
+    """Потоковая склейка сегментов параллельно с загрузкой
+    
+    Сегменты отдаются в выход, как только готов непрерывный префикс плейлиста:
+    - 'pipe': в stdin одного процесса ffmpeg, который пишет output.mp4;
+    - 'ts': дописываются в output.ts, а файлы сегментов сразу удаляются.
+      Число склеенных сегментов хранится в output.ts.part.json, поэтому
+      прерванная загрузка продолжается с первого несклеенного сегмента.
+    """
+    
+    def __init__(self, video_dir: Path, segments_dir: Path, total_segments: int, mode: str):
+        self.segments_dir = segments_dir
+        self.total_segments = total_segments
+        self.mode = mode
+        if self.mode == 'pipe' and shutil.which('ffmpeg') is None:
+            logging.warning("FFmpeg не найден, сегменты будут склеены в output.ts")
+            self.mode = 'ts'
+        
+        self.output_path = video_dir / ('output.mp4' if self.mode == 'pipe' else 'output.ts')
+        self.part_path = self.output_path.with_name(self.output_path.name + '.part')
+        self.state_path = self.part_path.with_name(self.part_path.name + '.json')
+        self.merged = 0
+        self._ready = set()
+        self._output = None
+        self._process = None
+        self._interrupted = False
+    
+    def _segment_path(self, index: int) -> Path:
+        return self.segments_dir / f'segment_{index:04d}.ts'
+    
+    def open(self) -> int:
+        """Открыть выход; возвращает число уже склеенных сегментов"""
+        if self.mode == 'pipe':
+            self._process = subprocess.Popen(
+                ['ffmpeg', '-loglevel', 'error', '-nostats', '-f', 'mpegts', '-i', 'pipe:0',
+                 '-c', 'copy', '-f', 'mp4', '-y', str(self.part_path)],
+                stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                bufsize=0
+            )
+            self._output = self._process.stdin
+            return 0
+        
+        size = 0
+        try:
+            state = json.loads(self.state_path.read_text(encoding='utf-8'))
+            if self.part_path.exists() and self.part_path.stat().st_size >= state['size']:
+                self.merged, size = state['merged'], state['size']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        
+        self._output = open(self.part_path, 'r+b' if size else 'wb', buffering=0)
+        self._output.truncate(size)
+        self._output.seek(size)
+        if self.merged:
+            logging.info(f"Продолжаем склейку с сегмента {self.merged + 1}/{self.total_segments}")
+        return self.merged
+    
+    def add(self, index: int):
+        """Отметить сегмент загруженным и склеить готовый префикс"""
+        self._ready.add(index)
+        while self.merged in self._ready:
+            self._ready.discard(self.merged)
+            segment_path = self._segment_path(self.merged)
+            _append_file(segment_path, self._output)
+            # Сначала фиксируем прогресс, затем удаляем сегмент
+            self._advance()
+            if self.mode == 'ts':
+                segment_path.unlink(missing_ok=True)
+    
+    def write(self, data: bytes):
+        """Дописать следующий по порядку сегмент из памяти"""
+        view = memoryview(data)
+        while view:
+            written = self._output.write(view)
+            view = view[written:]
+        self._advance()
+    
+    def _advance(self):
+        """Учесть очередной склеенный сегмент"""
+        self.merged += 1
+        if self.mode == 'ts':
+            tmp_path = self.state_path.with_name(self.state_path.name + '.tmp')
+            tmp_path.write_text(json.dumps({'merged': self.merged, 'size': self._output.tell()}),
+                                encoding='utf-8')
+            tmp_path.replace(self.state_path)
+    
+    def finish(self) -> bool:
+        """Завершить склейку после загрузки всех сегментов"""
+        if self.merged < self.total_segments:
+            logging.error(f"Склеено {self.merged} из {self.total_segments} сегментов")
+            self.abort()
+            return False
+        
+        if self.mode == 'pipe':
+            try:
+                _, stderr = self._process.communicate(timeout=FFMPEG_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                logging.error("Таймаут при объединении сегментов")
+                self.abort()
+                return False
+            if self._process.returncode != 0:
+                if not self._interrupted:
+                    logging.error(f"Ошибка FFmpeg: {stderr.decode(errors='replace')}")
+                self.part_path.unlink(missing_ok=True)
+                return False
+        else:
+            self._output.close()
+        
+        self.part_path.replace(self.output_path)
+        self.state_path.unlink(missing_ok=True)
+        shutil.rmtree(self.segments_dir, ignore_errors=True)
+        (self.segments_dir.parent / 'manifest.json').unlink(missing_ok=True)
+        logging.info(f"Видео успешно объединено: {self.output_path}")
+        return True
+    
+    def interrupt(self):
+        """Прервать ffmpeg из другого потока (остановка загрузки во время finish)"""
+        self._interrupted = True
+        if self._process is not None:
+            self._process.kill()
+    
+    def abort(self):
+        """Прервать склейку; для 'ts' частичный результат сохраняется для докачки"""
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self.part_path.unlink(missing_ok=True)
+        elif self._output is not None:
+            self._output.close()
+
+
+class ReorderBuffer:
+    """Буфер переупорядочивания сегментов с ограничением по памяти
+    
+    Потоки загрузки кладут сегменты в любом порядке, а потребитель забирает
+    их строго по возрастанию индекса. Когда бюджет исчерпан, put блокирует
+    загрузчика, но следующий ожидаемый сегмент принимается всегда,
+    иначе буфер мог бы заблокироваться навсегда.
+    """
+    
+    def __init__(self, budget: int, start_index: int = 0):
+        self.budget = budget
+        self.next_index = start_index
+        self.used = 0
+        self._items = {}
+        self._closed = False
+        self._condition = threading.Condition()
+    
+    def put(self, index: int, data: bytes) -> bool:
+        """Положить сегмент; False, если буфер закрыт"""
+        with self._condition:
+            while (not self._closed and index != self.next_index
+                   and self.used + len(data) > self.budget):
+                self._condition.wait()
+            if self._closed:
+                return False
+            self._items[index] = data
+            self.used += len(data)
+            self._condition.notify_all()
+            return True
+    
+    def get(self) -> Optional[bytes]:
+        """Забрать следующий по порядку сегмент; None, если буфер закрыт"""
+        with self._condition:
+            while not self._closed and self.next_index not in self._items:
+                self._condition.wait()
+            if self._closed:
+                return None
+            data = self._items.pop(self.next_index)
+            self.used -= len(data)
+            self.next_index += 1
+            self._condition.notify_all()
+            return data
+    
+    def close(self):
+        """Закрыть буфер и разбудить все ожидающие потоки"""
+        with self._condition:
+            self._closed = True
+            self._items.clear()
+            self.used = 0
+            self._condition.notify_all()
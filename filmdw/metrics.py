@@ -0,0 +1,249 @@
+"""Метрики загрузчика в текстовом формате Prometheus
+
+Собственная небольшая реализация счетчиков, индикаторов и гистограмм:
+пакет prometheus_client не нужен. Метрики читаются либо снимком
+(snapshot), либо по HTTP с локального адреса (start_metrics_server).
+"""
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Границы гистограмм, с
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+MERGE_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """Метрика с набором меток; значения хранятся по кортежу значений меток"""
+    kind = ''
+    
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+    
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+    
+    def _labels(self, key: tuple, extra: tuple = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+    
+    def samples(self) -> list:
+        """Строки (имя, метки, значение) для текстового формата"""
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+    
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {self._labels(key): value for key, value in self._values.items()}
+
+
+class Counter(Metric):
+    kind = 'counter'
+    
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+    
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+    
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+    
+    @contextmanager
+    def track(self, **labels):
+        """Увеличить индикатор на время блока (например, открытые соединения)"""
+        self.inc(1, **labels)
+        try:
+            yield
+        finally:
+            self.dec(1, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (),
+                 buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+    
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+    
+    @contextmanager
+    def time(self, **labels):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+    
+    def _cumulative(self, counts: list) -> list:
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets, counts):
+            total += count
+            result.append((bound, total))
+        return result
+    
+    def samples(self) -> list:
+        with self._lock:
+            states = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        lines = []
+        for key, counts, total_sum, count in states:
+            for bound, cumulative in self._cumulative(counts):
+                lines.append((f'{self.name}_bucket', self._labels(key, (('le', _number(bound)),)),
+                              cumulative))
+            lines.append((f'{self.name}_sum', self._labels(key), total_sum))
+            lines.append((f'{self.name}_count', self._labels(key), count))
+        return lines
+    
+    def snapshot(self) -> dict:
+        with self._lock:
+            states = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        return {
+            self._labels(key): {
+                'count': count,
+                'sum': total_sum,
+                'buckets': {_number(bound): cumulative
+                            for bound, cumulative in self._cumulative(counts)},
+            }
+            for key, counts, total_sum, count in states
+        }
+
+
+class MetricsRegistry:
+    """Набор метрик с выводом в текстовом формате Prometheus"""
+    
+    def __init__(self):
+        self._metrics = []
+    
+    def _register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+    
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+    
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (),
+                  buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+    
+    def snapshot(self) -> dict:
+        """Текущие значения: {имя: {'type': ..., 'values': {метки: значение}}}"""
+        return {metric.name: {'type': metric.kind, 'values': metric.snapshot()}
+                for metric in self._metrics}
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {_escape(metric.documentation)}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class DownloadMetrics(MetricsRegistry):
+    """Метрики горячего пути загрузки
+    
+    Один экземпляр разделяют все загрузки планировщика, как пул соединений
+    и кэш: метрики описывают процесс, а не отдельное задание.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.segment_seconds = self.histogram(
+            'filmdw_segment_duration_seconds', 'Время загрузки сегмента от запроса до последнего байта')
+        self.segment_ttfb = self.histogram(
+            'filmdw_segment_ttfb_seconds', 'Время до получения заголовков ответа на запрос сегмента')
+        self.download_bytes = self.counter(
+            'filmdw_download_bytes_total', 'Байт тела ответов, полученных из сети')
+        self.segments = self.counter(
+            'filmdw_segments_total', 'Сегменты по результату: ok, cache, error', ('result',))
+        self.retries = self.counter(
+            'filmdw_retries_total', 'Повторные запросы по причине ошибки', ('cause',))
+        self.active_connections = self.gauge(
+            'filmdw_active_connections', 'Запросы, ожидающие или читающие ответ')
+        self.queue_depth = self.gauge(
+            'filmdw_segment_queue_depth', 'Сегменты, ожидающие отправки или повтора')
+        self.merge_seconds = self.histogram(
+            'filmdw_merge_duration_seconds', 'Время завершения склейки или сведения дорожек',
+            ('mode',), MERGE_BUCKETS)
+
+
+def start_metrics_server(registry: MetricsRegistry, port: int, host: str = '127.0.0.1'):
+    """HTTP-сервер метрик в фоновом потоке: /metrics (Prometheus) и /metrics.json (снимок)
+    
+    Возвращает сервер; остановка - server.shutdown().
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body, content_type = registry.render().encode('utf-8'), CONTENT_TYPE
+            elif self.path == '/metrics.json':
+                body = json.dumps(registry.snapshot(), ensure_ascii=False).encode('utf-8')
+                content_type = 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            logging.debug(f"Метрики: {format % args}")
+    
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    logging.info(f"Метрики доступны на http://{host}:{server.server_port}/metrics")
+    return server
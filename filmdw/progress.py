@@ -0,0 +1,85 @@
+"""Сбор событий прогресса из потоков загрузки для периодического опроса GUI"""
+import math
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+# Постоянная времени сглаживания скорости, с: чем больше, тем спокойнее ETA
+SPEED_TIME_CONSTANT = 3.0
+
+
+@dataclass
+class ProgressSnapshot:
+    """Состояние загрузки на момент опроса"""
+    current: int
+    total: int
+    percentage: float
+    speed: float  # байт/с
+    eta: Optional[float]  # с; None, пока скорость неизвестна
+    concurrency: int = 0
+
+
+class ProgressTracker:
+    """Промежуточный слой между VideoDownloader и интерфейсом
+    
+    update вызывается потоками загрузки на каждое событие и только
+    заменяет ссылку на кортеж последнего состояния (атомарно под GIL,
+    без блокировок). Интерфейс опрашивает poll с частотой кадров:
+    сколько бы событий ни пришло между кадрами, перерисовка одна.
+    
+    Скорость сглаживается экспоненциально по времени. Для HLS берется
+    измеренная пропускная способность из stats, для MP4 прогресс и так
+    в байтах. ETA считается по сглаженной скорости продвижения current.
+    """
+    
+    def __init__(self, time_constant: float = SPEED_TIME_CONSTANT):
+        self.time_constant = time_constant
+        self.reset()
+    
+    def reset(self):
+        self._latest = None
+        self._seen = None
+        self._last_current = 0
+        self._last_time = 0.0
+        self._rate = 0.0  # единиц current в секунду
+        self._speed = 0.0
+        self._warm = False
+    
+    def update(self, current: int, total: int, stats: Optional[dict] = None):
+        """Событие прогресса (из любого потока)"""
+        self._latest = (current, total, stats, time.monotonic())
+    
+    def poll(self) -> Optional[ProgressSnapshot]:
+        """Текущее состояние или None, если с прошлого опроса ничего не пришло"""
+        latest = self._latest
+        if latest is None or latest is self._seen:
+            return None
+        self._seen = latest
+        current, total, stats, now = latest
+        
+        if self._last_time and now > self._last_time and current >= self._last_current:
+            elapsed = now - self._last_time
+            # Первое измерение берется как есть, чтобы скорость не разгонялась с нуля
+            weight = 1 - math.exp(-elapsed / self.time_constant) if self._warm else 1.0
+            self._warm = True
+            self._rate += weight * ((current - self._last_current) / elapsed - self._rate)
+            speed = stats['throughput'] if stats else self._rate
+            self._speed += weight * (speed - self._speed)
+        elif current < self._last_current:
+            # Новая загрузка или смена единиц (сегменты другой дорожки)
+            self._rate = self._speed = 0.0
+            self._warm = False
+        self._last_current = current
+        self._last_time = now
+        
+        eta = None
+        if self._rate > 0 and total:
+            eta = max(0, total - current) / self._rate
+        return ProgressSnapshot(
+            current=current,
+            total=total,
+            percentage=current / total * 100 if total else 0.0,
+            speed=self._speed,
+            eta=eta,
+            concurrency=stats['concurrency'] if stats else 0,
+        )
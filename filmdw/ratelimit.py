@@ -0,0 +1,91 @@
+"""Ограничение скорости загрузки: маркерная корзина с резервированием"""
+import threading
+import time
+from typing import Callable, Optional
+
+RESERVE_QUANTUM = 64 * 1024  # Наименьшая порция, которую поток списывает из корзин, байт
+RESERVE_SLICES = 50  # Порция - не меньше 1/RESERVE_SLICES секунды трафика
+
+
+class TokenBucket:
+    """Маркерная корзина на rate байт/с (0 - без ограничения)
+    
+    reserve(n) списывает маркеры сразу, уходя при необходимости в долг,
+    и возвращает время, которое нужно выждать. Под блокировкой выполняется
+    только арифметика, а ожидание - снаружи, поэтому потоки загрузки
+    не выстраиваются в очередь на замке. Скорость меняется на лету.
+    """
+    
+    def __init__(self, rate: float = 0, burst: Optional[float] = None):
+        self._lock = threading.Lock()
+        self.rate = 0.0
+        self.burst = 0.0
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self.set_rate(rate, burst)
+    
+    def set_rate(self, rate: float, burst: Optional[float] = None):
+        """Изменить скорость; запас по умолчанию - одна секунда трафика"""
+        with self._lock:
+            self._refill()
+            self.rate = max(0.0, float(rate))
+            self.burst = float(burst) if burst else self.rate
+            self._tokens = min(self._tokens, self.burst)
+    
+    def reserve(self, amount: int) -> float:
+        """Списать amount байт; возвращает задержку в секундах"""
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            if not self.rate:
+                return 0.0
+            self._refill()
+            self._tokens -= amount
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+    
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class BandwidthLimiter:
+    """Общий и собственный лимит одной загрузки
+    
+    Общая корзина разделяется всеми загрузками (задания очереди),
+    собственная ограничивает одно задание. Ждать нужно дольше из двух.
+    Поток загрузки копит полученные байты у себя и списывает их из корзин
+    порцией, так что замки корзин берутся раз на порцию, а не на каждый
+    кусок. Несписанный хвост списывает release в конце запроса.
+    """
+    
+    def __init__(self, shared: TokenBucket, own: TokenBucket):
+        self.shared = shared
+        self.own = own
+        self._local = threading.local()  # Несписанные байты текущего потока
+    
+    def reserve(self, amount: int) -> float:
+        return max(self.shared.reserve(amount), self.own.reserve(amount))
+    
+    def consume(self, amount: int, sleep: Callable[[float], bool]) -> bool:
+        """Списать amount байт и выждать через sleep; False, если ожидание прервано"""
+        rates = [bucket.rate for bucket in (self.shared, self.own) if bucket.rate]
+        if not rates:
+            return True
+        pending = getattr(self._local, 'pending', 0) + amount
+        if pending < max(RESERVE_QUANTUM, int(min(rates) / RESERVE_SLICES)):
+            self._local.pending = pending
+            return True
+        self._local.pending = 0
+        delay = self.reserve(pending)
+        return sleep(delay) if delay > 0 else True
+    
+    def release(self, sleep: Callable[[float], bool]) -> bool:
+        """Списать накопленный хвост текущего потока в конце запроса и выждать"""
+        pending = getattr(self._local, 'pending', 0)
+        if not pending:
+            return True
+        self._local.pending = 0
+        delay = self.reserve(pending)
+        return sleep(delay) if delay > 0 else True
@@ -0,0 +1,166 @@
+"""Журнал докачки MP4 и манифест загруженных сегментов"""
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Optional
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+@dataclass
+class ResumeJournal:
+    """Журнал докачки MP4: валидаторы файла и прогресс по диапазонам
+    
+    Хранится рядом с частично загруженным файлом (output.mp4.part.json).
+    Каждый диапазон записан как [начало, конец, текущая позиция].
+    """
+    url: str
+    size: int
+    etag: str = ''
+    last_modified: str = ''
+    ranges: list = field(default_factory=list)
+    
+    @classmethod
+    def load(cls, path: Path) -> Optional['ResumeJournal']:
+        try:
+            return cls(**json.loads(path.read_text(encoding='utf-8')))
+        except (OSError, ValueError, TypeError):
+            return None
+    
+    def save(self, path: Path):
+        """Атомарная запись журнала"""
+        tmp_path = path.with_name(path.name + '.tmp')
+        tmp_path.write_text(json.dumps(asdict(self)), encoding='utf-8')
+        tmp_path.replace(path)
+    
+    def matches(self, other: 'ResumeJournal') -> bool:
+        """Совпадают ли размер и валидаторы с текущей версией файла на сервере"""
+        if self.size != other.size:
+            return False
+        if self.etag or other.etag:
+            return self.etag == other.etag
+        return self.last_modified == other.last_modified
+    
+    @property
+    def if_range(self) -> str:
+        """Значение заголовка If-Range (сильный ETag или Last-Modified)"""
+        if self.etag and not self.etag.startswith('W/'):
+            return self.etag
+        return self.last_modified
+
+
+class _Crc32:
+    """Инкрементальный CRC32 с интерфейсом hashlib"""
+    name = 'crc32'
+    
+    def __init__(self):
+        self.value = 0
+    
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+    
+    def hexdigest(self) -> str:
+        return f'{self.value:08x}'
+
+
+def _new_checksum(algorithm: Optional[str] = None):
+    """Быстрая контрольная сумма сегмента: xxh64, если установлен xxhash, иначе CRC32"""
+    if algorithm is None:
+        algorithm = 'xxh64' if xxhash is not None else 'crc32'
+    if algorithm == 'xxh64' and xxhash is not None:
+        return xxhash.xxh64()
+    if algorithm == 'crc32':
+        return _Crc32()
+    return None
+
+
+class SegmentManifest:
+    """Манифест загруженных сегментов (video_dir/manifest.json)
+    
+    Для каждого сегмента хранит URI, размер файла, Content-Length и контрольную
+    сумму. При докачке сегменты проверяются по манифесту за один проход
+    по каталогу, а файлы без записи или с несовпадающим размером удаляются.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self.segments = {}
+        self.algorithm = _new_checksum().name.lower()
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+            self.segments = data['segments']
+            self.algorithm = data['algorithm']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+    
+    def new_checksum(self):
+        return _new_checksum(self.algorithm)
+    
+    def record(self, index: int, uri: str, size: int, content_length: Optional[str], checksum: str):
+        """Записать загруженный сегмент; манифест сохраняется не чаще раза в секунду"""
+        with self._lock:
+            self.segments[str(index)] = {
+                'uri': uri,
+                'size': size,
+                'content_length': int(content_length) if content_length else None,
+                'checksum': checksum,
+            }
+            if time.monotonic() - self._last_save >= 1.0:
+                self._save()
+    
+    def save(self):
+        with self._lock:
+            self._save()
+    
+    def _save(self):
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        tmp_path.write_text(json.dumps({'algorithm': self.algorithm, 'segments': self.segments}),
+                            encoding='utf-8')
+        tmp_path.replace(self.path)
+        self._last_save = time.monotonic()
+    
+    def verify(self, segments_dir: Path, segment_urls: list, deep: bool = False) -> set:
+        """Индексы сегментов, которые уже загружены и совпадают с манифестом
+        
+        Остальные файлы сегментов и недописанные .part удаляются.
+        При deep=True контрольные суммы пересчитываются по содержимому файлов.
+        """
+        valid = set()
+        with os.scandir(segments_dir) as entries:
+            files = {entry.name: entry for entry in entries if entry.is_file()}
+        
+        for name, entry in files.items():
+            if not name.startswith('segment_'):
+                continue
+            if name.endswith('.ts'):
+                index_text = name[len('segment_'):-len('.ts')]
+                index = int(index_text) if index_text.isdigit() else -1
+                record = self.segments.get(str(index))
+                if (0 <= index < len(segment_urls) and record is not None
+                        and record['uri'] == segment_urls[index]
+                        and record['size'] == entry.stat().st_size
+                        and (not deep or self._checksum_matches(Path(entry.path), record))):
+                    valid.add(index)
+                    continue
+                logging.warning(f"Сегмент {name} не совпадает с манифестом, будет загружен заново")
+            Path(entry.path).unlink(missing_ok=True)
+        return valid
+    
+    def _checksum_matches(self, path: Path, record: dict) -> bool:
+        checksum = self.new_checksum()
+        if checksum is None:
+            return True
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                checksum.update(chunk)
+        return checksum.hexdigest() == record['checksum']
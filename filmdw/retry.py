@@ -0,0 +1,177 @@
+"""Политика повторных попыток и похостовый автоматический выключатель"""
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from urllib.parse import urlparse
+
+from .config import DownloadConfig
+
+
+class RetryLater(Exception):
+    """Временная ошибка: задачу нужно повторить не раньше чем через delay секунд"""
+    
+    def __init__(self, delay: float, cause: Exception):
+        super().__init__(f"повтор через {delay:.1f} с: {cause}")
+        self.delay = delay
+        self.cause = cause
+
+
+class RetryPolicy:
+    """Экспоненциальная задержка с джиттером и учетом Retry-After
+    
+    Повторяются таймауты, обрывы соединения, неполные ответы,
+    а также HTTP 408, 425, 429 и 5xx. Остальные ошибки 4xx считаются
+    окончательными: повтор их не исправит.
+    """
+    
+    RETRYABLE_STATUSES = {408, 425, 429}
+    
+    def __init__(self, config: DownloadConfig):
+        self.config = config
+    
+    def is_retryable(self, error: Exception) -> bool:
+        import requests
+        response = getattr(error, 'response', None)
+        if isinstance(error, requests.exceptions.HTTPError) and response is not None:
+            status = response.status_code
+            return status in self.RETRYABLE_STATUSES or status >= 500
+        return isinstance(error, (
+            requests.exceptions.Timeout,
+            requests.exceptions.ConnectionError,
+            requests.exceptions.ChunkedEncodingError,
+            requests.exceptions.ContentDecodingError,
+        ))
+    
+    @staticmethod
+    def cause(error: Exception) -> str:
+        """Короткое имя причины ошибки для метрик: http_503, timeout, connection..."""
+        import requests
+        response = getattr(error, 'response', None)
+        if isinstance(error, requests.exceptions.HTTPError) and response is not None:
+            return f'http_{response.status_code}'
+        if isinstance(error, requests.exceptions.Timeout):
+            return 'timeout'
+        if isinstance(error, requests.exceptions.ConnectionError):
+            return 'connection'
+        if isinstance(error, (requests.exceptions.ChunkedEncodingError,
+                              requests.exceptions.ContentDecodingError)):
+            return 'incomplete'
+        return 'other'
+    
+    def delay(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """Задержка перед попыткой attempt + 1 (attempt считается с нуля)"""
+        retry_after = self._retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.config.retry_max_delay)
+        # "Полный джиттер": равномерно от 0 до экспоненциального предела
+        ceiling = min(self.config.retry_max_delay, self.config.retry_delay * 2 ** attempt)
+        return random.uniform(0, ceiling)
+    
+    @staticmethod
+    def _retry_after(error: Optional[Exception]) -> Optional[float]:
+        response = getattr(error, 'response', None)
+        value = response.headers.get('retry-after') if response is not None else None
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class CircuitBreaker:
+    """Автоматический выключатель одного хоста
+    
+    Ограничивает число одновременных запросов к хосту. Каждая временная
+    ошибка вдвое снижает предел, серия успехов увеличивает его на единицу
+    (AIMD). После breaker_threshold ошибок подряд хост закрывается
+    на breaker_cooldown секунд, затем пропускается один пробный запрос.
+    """
+    
+    def __init__(self, host: str, config: DownloadConfig):
+        self.host = host
+        self.config = config
+        self.max_limit = max(1, config.max_workers)
+        self.limit = self.max_limit
+        self.active = 0
+        self.failures = 0
+        self.successes = 0
+        self.open_until = 0.0
+        self._condition = threading.Condition()
+    
+    def acquire(self, is_stopped) -> bool:
+        """Занять слот; False, если загрузка остановлена во время ожидания"""
+        with self._condition:
+            while not is_stopped():
+                delay = self.open_until - time.monotonic()
+                if delay <= 0 and self.active < self.limit:
+                    self.active += 1
+                    return True
+                self._condition.wait(delay if delay > 0 else None)
+            return False
+    
+    def release(self, success: Optional[bool]):
+        """Освободить слот; success=None - исход не говорит о состоянии хоста"""
+        with self._condition:
+            self.active -= 1
+            if success:
+                self.failures = 0
+                self.successes += 1
+                if self.limit < self.max_limit and self.successes >= self.limit:
+                    self.limit += 1
+                    self.successes = 0
+            elif success is False:
+                self.failures += 1
+                self.successes = 0
+                self.limit = max(1, self.limit // 2)
+                if self.failures >= self.config.breaker_threshold:
+                    self.open_until = time.monotonic() + self.config.breaker_cooldown
+                    self.failures = 0
+                    logging.warning(f"Хост {self.host} деградировал: запросы приостановлены "
+                                    f"на {self.config.breaker_cooldown:.0f} с")
+            self._condition.notify_all()
+    
+    def wake(self):
+        """Разбудить ожидающие потоки (при остановке загрузки)"""
+        with self._condition:
+            self._condition.notify_all()
+
+
+class CircuitBreakers:
+    """Реестр выключателей по хостам; может быть общим для нескольких загрузок"""
+    
+    def __init__(self, config: DownloadConfig):
+        self.config = config
+        self._breakers = {}
+        self._lock = threading.Lock()
+    
+    def get(self, url: str) -> CircuitBreaker:
+        host = urlparse(url).netloc
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(host, self.config)
+            return breaker
+    
+    @contextmanager
+    def slot(self, url: str, manager):
+        """Слот запроса к хосту url; выдает None, если загрузка остановлена
+        
+        Исход запроса сообщается через outcome[0] внутри блока.
+        """
+        breaker = self.get(url)
+        with manager.track(breaker.wake):
+            acquired = breaker.acquire(lambda: manager.is_stopped)
+        outcome = [None]
+        try:
+            yield outcome if acquired else None
+        finally:
+            if acquired:
+                breaker.release(outcome[0])
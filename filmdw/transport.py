@@ -0,0 +1,315 @@
+"""HTTP-транспорты с пулом постоянных соединений
+
+requests, httpx и asyncio импортируются при создании транспорта,
+чтобы импорт пакета не тратил на них время запуска.
+"""
+import concurrent.futures
+import logging
+import socket
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional, Callable
+
+from .config import DownloadConfig
+
+
+DEFAULT_HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+
+_local = threading.local()  # Запрос, который текущий поток выполняет через SessionTransport
+
+
+class RequestHandle:
+    """Прерывание запроса из другого потока
+    
+    Транспорт привязывает к нему текущую операцию запроса: сначала ожидание
+    заголовков, затем чтение тела. Прерывание до привязки не теряется:
+    следующая привязанная операция прерывается сразу. Прерванный поток
+    получает исключение requests.exceptions.
+    """
+    
+    def __init__(self):
+        self.interrupted = False
+        self._cancel: Optional[Callable] = None
+        self._lock = threading.Lock()
+    
+    def bind(self, cancel: Optional[Callable]):
+        """Привязать прерывание текущей операции (None - операции нет)"""
+        with self._lock:
+            self._cancel = cancel
+            interrupted = self.interrupted
+        if interrupted and cancel is not None:
+            cancel()
+    
+    def interrupt(self):
+        with self._lock:
+            self.interrupted = True
+            cancel = self._cancel
+        if cancel is not None:
+            cancel()
+
+
+def connections_per_download(config: DownloadConfig) -> int:
+    """Наибольшее число соединений одной загрузки: сегменты или диапазоны MP4"""
+    return max(1, config.max_workers, config.mp4_connections)
+
+
+class HttpTransport(ABC):
+    """Базовый HTTP-транспорт с пулом постоянных соединений
+    
+    Метод get возвращает объект с интерфейсом requests.Response
+    (status_code, headers, content, text, iter_content, raise_for_status, close),
+    а ошибки сети пробрасываются как исключения requests.exceptions.
+    Через handle запрос можно прервать из другого потока на любом этапе.
+    """
+    
+    def __init__(self, config: DownloadConfig):
+        self.config = config
+        self.pool_size = config.pool_size or connections_per_download(config)
+    
+    @abstractmethod
+    def get(self, url: str, timeout: float, stream: bool = False,
+            headers: Optional[dict] = None, handle: Optional[RequestHandle] = None):
+        """GET-запрос; stream=True - тело читается через iter_content"""
+    
+    def close(self):
+        """Закрыть все соединения пула"""
+        pass
+
+
+def _shutdown(sock):
+    """Разбудить поток, заблокированный в recv на этом сокете
+    
+    Закрытие ответа из чужого потока не будит recv, а shutdown сокета будит;
+    такое соединение urllib3 не вернет в пул.
+    """
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+def _shutdown_response(response):
+    """Оборвать соединение, из которого читается тело ответа requests
+    
+    После возврата соединения в пул ответ его больше не держит.
+    """
+    connection = getattr(response.raw, '_connection', None)
+    _shutdown(getattr(connection, 'sock', None))
+
+
+def _interruptible_adapter(pool_size: int):
+    """HTTPAdapter, чьи соединения привязываются к RequestHandle потока
+    
+    Пока запрос ждет соединение, подключается и ждет заголовков, прерывание
+    обрывает сокет этого соединения; при возврате соединения в пул привязка
+    снимается, чтобы не задеть чужой запрос.
+    """
+    import requests.adapters
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+    
+    class InterruptibleConnection:
+        def connect(self):
+            super().connect()
+            handle = getattr(_local, 'handle', None)
+            if handle is not None:
+                handle.bind(self.interrupt)
+        
+        def interrupt(self):
+            _shutdown(self.sock)
+    
+    class InterruptiblePool:
+        def _get_conn(self, timeout=None):
+            conn = super()._get_conn(timeout)
+            handle = getattr(_local, 'handle', None)
+            if handle is not None:
+                handle.bind(conn.interrupt)
+            return conn
+        
+        def _put_conn(self, conn):
+            handle = getattr(_local, 'handle', None)
+            if handle is not None:
+                handle.bind(None)
+            super()._put_conn(conn)
+    
+    class HTTPPool(InterruptiblePool, HTTPConnectionPool):
+        ConnectionCls = type('Connection', (InterruptibleConnection, HTTPConnection), {})
+    
+    class HTTPSPool(InterruptiblePool, HTTPSConnectionPool):
+        ConnectionCls = type('HTTPSConnection', (InterruptibleConnection, HTTPSConnection), {})
+    
+    class Adapter(requests.adapters.HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {'http': HTTPPool, 'https': HTTPSPool}
+    
+    return Adapter(pool_connections=pool_size, pool_maxsize=pool_size)
+
+
+class SessionTransport(HttpTransport):
+    """Синхронный транспорт на общем requests.Session с keep-alive"""
+    
+    def __init__(self, config: DownloadConfig):
+        super().__init__(config)
+        import requests
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = _interruptible_adapter(self.pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+    
+    def get(self, url: str, timeout: float, stream: bool = False,
+            headers: Optional[dict] = None, handle: Optional[RequestHandle] = None):
+        if handle is None:
+            return self.session.get(url, timeout=timeout, stream=stream, headers=headers)
+        
+        _local.handle = handle
+        try:
+            response = self.session.get(url, timeout=timeout, stream=stream, headers=headers)
+        finally:
+            _local.handle = None
+            handle.bind(None)
+        # Тело читается уже вне вызова пула: дальше прерывание обрывает соединение ответа
+        handle.bind(lambda: _shutdown_response(response))
+        return response
+    
+    def close(self):
+        self.session.close()
+
+
+class _AsyncResponse:
+    """Синхронная обертка над ответом httpx из цикла событий транспорта"""
+    
+    def __init__(self, transport: 'AsyncHttpTransport', response, stream: bool,
+                 handle: Optional[RequestHandle]):
+        self._transport = transport
+        self._response = response
+        self._stream = stream
+        self._handle = handle
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+    
+    @property
+    def content(self) -> bytes:
+        if self._stream:
+            self._transport._run(self._response.aread(), self._handle)
+            self._stream = False
+        return self._response.content
+    
+    @property
+    def text(self) -> str:
+        self.content
+        return self._response.text
+    
+    def iter_content(self, chunk_size: int = 8192):
+        chunks = self._response.aiter_bytes(chunk_size)
+        try:
+            while True:
+                try:
+                    yield self._transport._run(chunks.__anext__(), self._handle)
+                except StopAsyncIteration:
+                    break
+        finally:
+            self.close()
+    
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.exceptions.HTTPError(
+                f"{self.status_code} Error for url: {self.url}", response=self
+            )
+    
+    def close(self):
+        self._transport._run(self._response.aclose())
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+
+
+class AsyncHttpTransport(HttpTransport):
+    """Асинхронный транспорт httpx с мультиплексированием HTTP/2
+    
+    Цикл событий работает в отдельном потоке, а потоки загрузки отправляют
+    в него запросы, поэтому тысячи сегментов идут через несколько соединений.
+    """
+    
+    def __init__(self, config: DownloadConfig):
+        super().__init__(config)
+        import asyncio
+        import httpx
+        import requests
+        self._asyncio = asyncio
+        self._httpx = httpx
+        self._requests = requests
+        # httpx пишет INFO-строку на каждый запрос
+        logging.getLogger('httpx').setLevel(logging.WARNING)
+        
+        limits = httpx.Limits(
+            max_connections=self.pool_size,
+            max_keepalive_connections=self.pool_size
+        )
+        try:
+            self._client = httpx.AsyncClient(
+                http2=config.http2, limits=limits, headers=DEFAULT_HEADERS
+            )
+        except ImportError:
+            logging.warning("Пакет h2 не установлен, используется HTTP/1.1")
+            self._client = httpx.AsyncClient(limits=limits, headers=DEFAULT_HEADERS)
+        
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name='transport-loop', daemon=True
+        )
+        self._thread.start()
+    
+    def _run(self, coro, handle: Optional[RequestHandle] = None):
+        """Выполнить корутину в цикле транспорта и дождаться результата
+        
+        Прерывание handle отменяет корутину.
+        """
+        future = self._asyncio.run_coroutine_threadsafe(coro, self._loop)
+        if handle is not None:
+            handle.bind(future.cancel)
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError as e:
+            raise self._requests.exceptions.ConnectionError("Запрос прерван") from e
+        except self._httpx.TimeoutException as e:
+            raise self._requests.exceptions.Timeout(str(e)) from e
+        except self._httpx.HTTPError as e:
+            raise self._requests.exceptions.ConnectionError(str(e)) from e
+    
+    async def _get(self, url: str, timeout: float, stream: bool,
+                   headers: Optional[dict]):
+        request = self._client.build_request('GET', url, headers=headers, timeout=timeout)
+        return await self._client.send(request, stream=stream, follow_redirects=True)
+    
+    def get(self, url: str, timeout: float, stream: bool = False,
+            headers: Optional[dict] = None, handle: Optional[RequestHandle] = None):
+        response = self._run(self._get(url, timeout, stream, headers), handle)
+        return _AsyncResponse(self, response, stream, handle)
+    
+    def close(self):
+        if self._loop.is_closed():
+            return
+        self._run(self._client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop.close()
+
+
+def create_transport(config: DownloadConfig) -> HttpTransport:
+    """Создание транспорта по DownloadConfig.transport"""
+    if config.transport == 'async':
+        try:
+            return AsyncHttpTransport(config)
+        except ImportError:
+            logging.warning("Пакет httpx не установлен, используется requests.Session")
+    elif config.transport != 'session':
+        logging.warning(f"Неизвестный транспорт {config.transport!r}, используется requests.Session")
+    return SessionTransport(config)
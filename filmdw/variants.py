@@ -0,0 +1,84 @@
+"""Выбор варианта качества и дорожек из мастер-плейлиста HLS"""
+from typing import Optional
+
+from .config import DownloadConfig
+
+# Доля измеренной скорости, которую может занять выбранный вариант:
+# запас нужен на колебания канала и дорожки звука
+THROUGHPUT_SHARE = 0.8
+
+# Замер скорости: сегменты самого легкого варианта, пока не наберется
+# THROUGHPUT_SAMPLE_BYTES, но не больше THROUGHPUT_SAMPLE_SEGMENTS сегментов.
+# Мелкий кусок чтения нужен, чтобы засечь момент первого байта тела.
+THROUGHPUT_SAMPLE_BYTES = 1024 * 1024
+THROUGHPUT_SAMPLE_SEGMENTS = 8
+THROUGHPUT_CHUNK_SIZE = 16 * 1024
+
+
+def variant_bandwidth(playlist) -> int:
+    """Битрейт варианта: AVERAGE-BANDWIDTH, если указан, иначе BANDWIDTH"""
+    info = playlist.stream_info
+    return info.average_bandwidth or info.bandwidth or 0
+
+
+def variant_height(playlist) -> int:
+    resolution = playlist.stream_info.resolution
+    return resolution[1] if resolution else 0
+
+
+def select_variant(master, config: DownloadConfig, throughput: float = 0.0):
+    """Выбор варианта по config.variant_selection
+    
+    'best' - наибольшее разрешение (при равном - больший битрейт),
+    'throughput' - наибольший битрейт, который укладывается в измеренную
+    скорость throughput (байт/с). В обоих случаях соблюдаются пределы
+    max_bandwidth и max_height; если под них не подходит ни один вариант,
+    берется самый легкий.
+    """
+    variants = [playlist for playlist in master.playlists if playlist.stream_info]
+    if not variants:
+        return None
+    
+    max_bandwidth = config.max_bandwidth
+    if config.variant_selection == 'throughput' and throughput > 0:
+        measured = int(throughput * 8 * THROUGHPUT_SHARE)
+        max_bandwidth = min(max_bandwidth, measured) if max_bandwidth else measured
+    
+    allowed = [
+        playlist for playlist in variants
+        if (not max_bandwidth or variant_bandwidth(playlist) <= max_bandwidth)
+        and (not config.max_height or variant_height(playlist) <= config.max_height)
+    ]
+    if not allowed:
+        return min(variants, key=variant_bandwidth)
+    
+    if config.variant_selection == 'throughput':
+        return max(allowed, key=lambda playlist: (variant_bandwidth(playlist), variant_height(playlist)))
+    return max(allowed, key=lambda playlist: (variant_height(playlist), variant_bandwidth(playlist)))
+
+
+def select_renditions(master, variant) -> list:
+    """Отдельные дорожки звука и субтитров, на которые ссылается вариант
+    
+    Из каждой группы берется дорожка с DEFAULT=YES, затем с AUTOSELECT=YES,
+    затем первая. Дорожки без URI уже входят в поток варианта.
+    """
+    renditions = []
+    for media_type, group_id in (('AUDIO', variant.stream_info.audio),
+                                 ('SUBTITLES', variant.stream_info.subtitles)):
+        if not group_id:
+            continue
+        group = [media for media in master.media
+                 if media.type == media_type and media.group_id == group_id]
+        chosen = _preferred(group)
+        if chosen is not None and chosen.uri:
+            renditions.append(chosen)
+    return renditions
+
+
+def _preferred(group: list) -> Optional[object]:
+    for attribute in ('default', 'autoselect'):
+        for media in group:
+            if (getattr(media, attribute) or '').upper() == 'YES':
+                return media
+    return group[0] if group else None